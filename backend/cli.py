@@ -8,71 +8,134 @@
         7. Листануть все таски пайплайна
 
 """
-from typing import TypedDict
+from typing import Iterator, TypedDict
 
-from backend.src.models import NextModel, TaskModel
+from backend.src.cache import pipeline_cache
+from backend.src.models import TaskModel
 from backend.utils import get_collection, get_db
 
-
-class AggPipeline(TypedDict):
+LIST_PAGE_SIZE = 100  # Pipelines of a listing page
+LIST_BATCH_SIZE = 500  # Pipelines fetched per round trip of a streaming cursor
+
+# Edges of a removed task are found by the edge index of [next], the new ones have the keys of TaskGraph.edge_records
+REMOVE_TASKS_TRANSACTION = '''
+function (params) {
+    const db = require('@arangodb').db;
+    for (const taskKey of params.task_keys) {
+        const task = db.task.exists(taskKey) && db.task.document(taskKey);
+        if (!task || task.pipeline_key !== params.pipeline_key) {
+            throw new Error(`Task [${taskKey}] is not in the pipeline [${params.pipeline_key}]`);
+        }
+        const inbound = db.next.inEdges(task._id);
+        const outbound = db.next.outEdges(task._id);
+        for (const inEdge of inbound) {
+            for (const outEdge of outbound) {
+                const edgeKey = `${inEdge._from.split('/')[1]}-${outEdge._to.split('/')[1]}`;
+                if (inEdge._from !== outEdge._to && !db.next.exists(edgeKey)) {
+                    db.next.insert({_key: edgeKey, _from: inEdge._from, _to: outEdge._to,
+                                    pipeline_key: params.pipeline_key});
+                }
+            }
+        }
+        db.next.removeByKeys(inbound.concat(outbound).map(edge => edge._key));
+        db.task.remove(task);
+    }
+    db.pipeline.update(params.pipeline_key, {});  // A new _rev invalidates the cached copies of the pipeline
+}
+'''
+
+# Pipelines with their tasks in one round trip: the filters are fixed fragments, every value is a bind variable.
+# The tasks are looked up by the persistent index on task.pipeline_key, pages are keyset ones ordered by _key
+PIPELINES_QUERY = '''
+    for pipe in pipeline
+        {filters}
+        sort pipe._key
+        {limit}
+        let tasks = (for t in task filter t.pipeline_key == pipe._key sort t._key return @with_tasks ? t : true)
+        return merge({{key: pipe._key, name: pipe.name, variables: count(pipe.variables), tasks: length(tasks)}},
+                     @with_tasks ? {{task_list: tasks}} : {{}})
+'''
+
+
+class AggPipeline(TypedDict, total=False):
     key: str
     name: str
     variables: int
     tasks: int
+    task_list: list[TaskModel]  # Only when the tasks are requested
+
 
+class PipelinesPage(TypedDict):
+    pipelines: list[AggPipeline]
+    next_after: str | None  # Key to continue the listing after, None on the last page
 
-def list_pipelines(pipeline: str = None) -> list[AggPipeline]:
-    filter_ = ''
+
+def iter_pipelines(pipeline: str = None, with_tasks: bool = False, after: str = None, limit: int = None,
+                   batch_size: int = LIST_BATCH_SIZE) -> Iterator[AggPipeline]:
+    """ Streams the pipelines ordered by key, [after] is the key of the last one already seen """
+    filters, bind_vars = [], {'with_tasks': with_tasks}
     if pipeline:
-        filter_ = f"filter pipe.name == '{pipeline}'"
+        filters.append('filter pipe.name == @name')
+        bind_vars['name'] = pipeline
+    if after is not None:
+        filters.append('filter pipe._key > @after')
+        bind_vars['after'] = after
+    if limit is not None:
+        bind_vars['limit'] = limit
+
+    query = PIPELINES_QUERY.format(filters='\n        '.join(filters),
+                                   limit='limit @limit' if limit is not None else '')
+    cursor = get_db().aql.execute(query, bind_vars=bind_vars, batch_size=batch_size, stream=True)
+    try:
+        yield from cursor
+    finally:
+        cursor.close(ignore_missing=True)  # A streaming cursor left unread holds its snapshot on the server
 
-    return list(get_db().aql.execute(f'''
-        for pipe in pipeline {filter_}
-        let tasks_count = count(for t in task filter t.pipeline_key == pipe._key return t)
-        return {{key: pipe._key, name: pipe.name, variables: count(pipe.variables), tasks: tasks_count}}
-    ''').batch())
+
+def list_pipelines(pipeline: str = None, with_tasks: bool = False) -> list[AggPipeline]:
+    return list(iter_pipelines(pipeline, with_tasks))
+
+
+def page_pipelines(pipeline: str = None, with_tasks: bool = False, after: str = None,
+                   limit: int = LIST_PAGE_SIZE) -> PipelinesPage:
+    pipelines = list(iter_pipelines(pipeline, with_tasks, after, limit + 1))  # One more tells a next page exists
+    next_after = pipelines[limit - 1]['key'] if len(pipelines) > limit else None
+    return {'pipelines': pipelines[:limit], 'next_after': next_after}
 
 
 def list_tasks(pipeline_key: str) -> list[TaskModel]:
-    return list(get_collection('task').find({'pipeline_key': pipeline_key}).batch())
+    """ Stored tasks of the pipeline, the values of secret attributes are left out """
+    from backend.src.main import Task  # The engine module is heavy, light commands do not need it
+
+    return [{**task, 'attributes': Task.task_class(task['task_type']).public_attributes(task['attributes'])}
+            for task in get_collection('task').find({'pipeline_key': pipeline_key})]
 
 
 def remove_pipeline(pipeline_key: str):
-    get_collection('task').delete_match({'pipeline_key': pipeline_key})
-    get_collection('next').delete_match({'pipeline_key': pipeline_key})
-    get_collection('pipeline').delete({'_key': pipeline_key})
+    """ Removes the pipeline with its tasks and edges in one query, a failure leaves nothing half removed """
+    get_db().aql.execute(
+        '''
+        let edges = (for e in next filter e.pipeline_key == @pipeline_key remove e in next)
+        let tasks = (for t in task filter t.pipeline_key == @pipeline_key remove t in task)
+        remove @pipeline_key in pipeline
+        ''',
+        bind_vars={'pipeline_key': pipeline_key}
+    )
+    pipeline_cache.invalidate(pipeline_key)
+
+
+def remove_tasks(pipeline_key: str, task_keys: list[str]):
+    """
+        Removes the tasks in one server-side transaction: every predecessor of a removed task is connected to every
+        successor of it. The tasks are removed one by one, so a removed chain connects what surrounded it.
+        Any of the tasks missing in the pipeline rolls the whole removal back.
+    """
+    get_db().execute_transaction(REMOVE_TASKS_TRANSACTION, params={'pipeline_key': pipeline_key,
+                                                                   'task_keys': list(task_keys)},
+                                 write=['task', 'next', 'pipeline'])
+    pipeline_cache.invalidate(pipeline_key)
 
 
 def remove_task(pipeline_key: str, task_key: str):
     """ Removing task collection records and next edge records """
-    task_col = get_collection('task')
-    next_col = get_collection('next')
-    next_edge_id = f'task/{task_key}'
-    all_nexts: list[NextModel] = list(next_col.find({'pipeline_key': pipeline_key}).batch())
-
-    if len(all_nexts) == 1:
-        next_col.delete_match({'pipeline_key': pipeline_key})
-    else:
-        try:
-            next_from: list[NextModel] = list(next_col.find({'_from': next_edge_id}).batch())
-        except StopIteration:
-            next_from = []
-        try:
-            next_to: list[NextModel] = list(next_col.find({'_to': next_edge_id}).batch())
-        except StopIteration:
-            next_to = []
-
-        if not next_to and next_from:
-            next_col.delete_many([{'_id': r['_id']} for r in next_from])
-        if next_to and not next_from:
-            next_col.delete_many([{'_id': r['_id']} for r in next_to])
-        elif len(next_from) == 1:
-            next_col.update_match(
-                filters={'_to': next_edge_id},
-                body={'_to': next_from[0]['_to']}
-            )
-            next_col.delete({'_id': next_from[0]['_id']})
-        else:
-            raise NotImplementedError
-
-    task_col.delete({'_key': task_key})
+    remove_tasks(pipeline_key, [task_key])
@@ -0,0 +1,226 @@
+"""
+    Benchmark of DownloadTask -> CSVQueryTask -> upload on synthetic CSVs, without Arango and SSH:
+    the pipeline lives in memory and the upload copies the dataset into a local directory.
+    Every dataset size is measured in its own process, so the peak RSS of one size doesn`t hide the next one.
+        > python -m backend.runs.benchmark --sizes 1MB,100MB --cardinality 1000 --output bench.json
+        > python -m backend.runs.benchmark --sizes 1MB,100MB --output new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from backend.src.main import (CSV_CHUNK_ROWS, CSVQueryTask, DownloadTask, LocalEngine, LocalStorage, Pipeline,
+                              ProgressType, SSHUploadTask)
+from backend.src.models import TaskMetrics
+from backend.src.ssh import SFTP_BLOCK_SIZE, SSHConnectionPool
+
+SIZES = '1MB,100MB,5GB'
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+CARDINALITY = 1000  # Distinct values of the [category] column
+GENERATE_ROWS = 200_000  # Rows generated and written at a time
+COLUMNS = 'id,category,label,value,created_at'
+QUERY = 'select category, count(*) as rows, sum(value) as total, avg(value) as mean from t group by category'
+REGRESSION_THRESHOLD = 0.1  # Relative slowdown of a stage reported as a regression
+MIN_COMPARED_TIME = 0.05  # Seconds, faster stages are too noisy to report regressions
+
+
+class LocalUploadTask(SSHUploadTask):
+    """ Stand-in of the SSH upload for benchmarks: copies the dataset into the [remote_path] directory """
+    __slots__ = ()
+
+    def execute(self, local_dataset_path: str | Path, connection_pool: SSHConnectionPool = None,
+                channels: int = 1, progress: ProgressType = None) -> list[str]:
+        local_dataset_path = Path(local_dataset_path)
+        local_paths = sorted(local_dataset_path.iterdir()) if local_dataset_path.is_dir() else [local_dataset_path]
+        target_dir = Path(self.attributes['remote_path'])
+        target_dir.mkdir(exist_ok=True, parents=True)
+
+        remote_paths = []
+        for local_path in local_paths:
+            with open(local_path, 'rb') as source, open(target_dir / local_path.name, 'wb') as target:
+                while block := source.read(SFTP_BLOCK_SIZE):
+                    target.write(block)
+                    if progress:
+                        progress(len(block))
+            remote_paths.append(str(target_dir / local_path.name))
+        return remote_paths
+
+
+def parse_size(size: str) -> int:
+    size = size.strip().upper()
+    for unit, multiplier in SIZE_UNITS.items():
+        if size.endswith(unit):
+            return int(float(size.removesuffix(unit)) * multiplier)
+    return int(size)
+
+
+def generate_csv(path: Path, size_bytes: int, cardinality: int = CARDINALITY, seed: int = 0) -> Path:
+    """ A headerless CSV of about [size_bytes] in the COLUMNS layout, kept and reused between the runs """
+    if path.exists():
+        return path
+
+    random = np.random.default_rng(seed)
+    tmp_path = path.with_name(path.name + '.tmp')
+    written, first_id = 0, 0
+    with open(tmp_path, 'w', newline='') as csv_file:
+        while written < size_bytes:
+            ids = np.arange(first_id, first_id + GENERATE_ROWS)
+            categories = random.integers(0, cardinality, GENERATE_ROWS)
+            frame = pd.DataFrame({
+                'id': ids,
+                'category': categories,
+                'label': np.char.add('label_', categories.astype(str)),
+                'value': random.random(GENERATE_ROWS).round(6),
+                'created_at': pd.Timestamp('2020-01-01') + pd.to_timedelta(ids, unit='s'),
+            })
+            chunk = frame.to_csv(header=False, index=False)
+            if written + len(chunk) > size_bytes:  # The last chunk is cut at a line boundary
+                chunk = chunk[:chunk.rfind('\n', 0, size_bytes - written) + 1] or chunk[:chunk.find('\n') + 1]
+            csv_file.write(chunk)
+            written += len(chunk)
+            first_id += GENERATE_ROWS
+    tmp_path.rename(path)
+    return path
+
+
+def benchmark_pipeline(csv_path: Path, work_dir: Path, query: str) -> Pipeline:
+    pipeline = Pipeline('benchmark')
+    download = DownloadTask(pipeline.key(), 'download')
+    download.set_input_attributes(source='Local File System', path=str(csv_path))
+    csv_query = CSVQueryTask(pipeline.key(), 'query')
+    csv_query.set_input_attributes(columns=COLUMNS, query=query)
+    upload = LocalUploadTask(pipeline.key(), 'upload')
+    upload.set_input_attributes(ssh_host='localhost', ssh_user='benchmark', ssh_password=None,
+                                remote_path=str(work_dir / 'uploaded'))
+    pipeline.add(download >> csv_query >> upload)
+    return pipeline
+
+
+def stage_result(metrics: TaskMetrics) -> dict:
+    wall_time = metrics['wall_time'] or 1e-9
+    return {
+        'wall_time': wall_time,
+        'cpu_time': metrics['cpu_time'],
+        'rows_in': metrics['rows_in'],
+        'rows_out': metrics['rows_out'],
+        'bytes_in': metrics['bytes_in'],
+        'bytes_out': metrics['bytes_out'],
+        'mb_per_s': max(metrics['bytes_in'], metrics['bytes_out']) / SIZE_UNITS['MB'] / wall_time,
+        'rows_per_s': metrics['rows_in'] / wall_time,
+        'peak_rss': metrics['peak_rss'],
+        'rss_growth': metrics['rss_growth'],
+        'storage_time': metrics.get('storage_time', {}),
+    }
+
+
+def run_size(size: str, cardinality: int, query: str, repeat: int, data_dir: Path, chunk_rows: int,
+             query_workers: int = 1) -> list[dict]:
+    """ Runs in a fresh process: generates the dataset if needed and measures every stage [repeat] times """
+    csv_path = generate_csv(data_dir / f'synthetic_{size}_{cardinality}.csv', parse_size(size), cardinality)
+
+    attempts: dict[str, list[dict]] = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='runemaster-benchmark-') as work_dir:
+            engine = LocalEngine(chunk_rows=chunk_rows, max_workers=1, use_cache=False, query_workers=query_workers,
+                                 storage=LocalStorage(str(Path(work_dir) / 'storage')))
+            record = engine.run(benchmark_pipeline(csv_path, Path(work_dir), query))
+
+        for metrics in record['tasks']:
+            attempts.setdefault(metrics['task_type'], []).append(stage_result(metrics))
+
+    results = []
+    for stage, stage_attempts in attempts.items():
+        median_attempt = sorted(stage_attempts, key=lambda attempt: attempt['wall_time'])[len(stage_attempts) // 2]
+        results.append({'size': size, 'dataset_bytes': csv_path.stat().st_size, 'cardinality': cardinality,
+                        'stage': stage, 'repeat': repeat, 'query_workers': query_workers,
+                        'wall_time_min': min(attempt['wall_time'] for attempt in stage_attempts),
+                        'wall_time_stdev': statistics.pstdev(attempt['wall_time'] for attempt in stage_attempts),
+                        **median_attempt})
+    return results
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {'revision': revision, 'python': platform.python_version(), 'platform': platform.platform(),
+            'pandas': pd.__version__, 'created_at': time.time()}
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """ Prints the change of every stage against the baseline, returns the regressions """
+    baseline_stages = {(result['size'], result['cardinality'], result['stage']): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline_stages.get((result['size'], result['cardinality'], result['stage']))
+        if old is None:
+            continue
+        change = result['wall_time'] / (old['wall_time'] or 1e-9) - 1
+        memory_change = result['peak_rss'] / (old['peak_rss'] or 1) - 1
+        line = (f'{result["size"]:>6} {result["stage"]:<16} {old["wall_time"]:9.3f}s -> {result["wall_time"]:9.3f}s '
+                f'({change:+.1%}), peak RSS {memory_change:+.1%}')
+        print(line)
+        if change > threshold and result['wall_time'] >= MIN_COMPARED_TIME:
+            regressions.append(line)
+    return regressions
+
+
+def print_results(results: list[dict]):
+    print(f'{"size":>6} {"stage":<16} {"wall, s":>9} {"cpu, s":>9} {"MB/s":>9} {"rows/s":>11} {"peak RSS, MB":>13}')
+    for result in results:
+        print(f'{result["size"]:>6} {result["stage"]:<16} {result["wall_time"]:9.3f} {result["cpu_time"]:9.3f} '
+              f'{result["mb_per_s"]:9.1f} {result["rows_per_s"]:11.0f} {result["peak_rss"] / SIZE_UNITS["MB"]:13.1f}')
+
+
+def main(arguments: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark of the engine, storage and query paths')
+    parser.add_argument('--sizes', default=SIZES, help=f'comma separated dataset sizes, default {SIZES}')
+    parser.add_argument('--cardinality', type=int, default=CARDINALITY, help='distinct values of the group column')
+    parser.add_argument('--query', default=QUERY)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every size, the median one is reported')
+    parser.add_argument('--chunk-rows', type=int, default=CSV_CHUNK_ROWS)
+    parser.add_argument('--query-workers', type=int, default=1, help='processes of a partitioned query')
+    parser.add_argument('--data-dir', default=str(Path(tempfile.gettempdir()) / 'runemaster-benchmark'),
+                        help='where the generated datasets are kept')
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--compare', help='JSON results of a previous version')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    options = parser.parse_args(arguments)
+
+    data_dir = Path(options.data_dir)
+    data_dir.mkdir(exist_ok=True, parents=True)
+
+    results = []
+    for size in options.sizes.split(','):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            results += executor.submit(run_size, size.strip(), options.cardinality, options.query, options.repeat,
+                                       data_dir, options.chunk_rows, options.query_workers).result()
+    print_results(results)
+
+    report = {'environment': environment(), 'query': options.query, 'results': results}
+    if options.output:
+        Path(options.output).write_text(json.dumps(report, indent=2))
+
+    if options.compare:
+        regressions = compare(results, json.loads(Path(options.compare).read_text())['results'], options.threshold)
+        if regressions:
+            print(f'{len(regressions)} stage(s) are slower by more than {options.threshold:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,7 @@
 import logging
 
-from arango import ArangoClient
-
 from backend.src.main import CSVQueryTask, DownloadTask, Pipeline, SSHUploadTask
+from backend.utils import get_db
 
 
 logging.basicConfig(level=logging.INFO)
@@ -11,8 +10,7 @@ if __name__ == '__main__':
     logging.info('Start')
 
     # Initialization of connection
-    client = ArangoClient(hosts='http://localhost:8529')
-    db = client.db('test', username='root')
+    db = get_db()
     task_graph = db.graph("task_graph")
     pipeline = db.collection('pipeline')
     task = task_graph.vertex_collection("task")
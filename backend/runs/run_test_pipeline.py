@@ -1,18 +1,20 @@
-from arango import ArangoClient
-
 from backend.src.main import LocalEngine, Pipeline
+from backend.src.models import EngineEvent
+from backend.utils import get_collection
+
+
+def print_event(event: EngineEvent):
+    details = ', '.join(f'{name}={value}' for name, value in event.items()
+                        if name not in ('event', 'pipeline_key', 'task_key', 'time'))
+    print(f'[{event["pipeline_key"]}] {event["task_key"] or ""} {event["event"]} {details}')
+
 
 if __name__ == '__main__':
     # Initialization of connection
-    client = ArangoClient(hosts='http://localhost:8529')
-    db = client.db('test', username='root')
-    task_graph = db.graph("task_graph")
-    pipeline = db.collection('pipeline')
-    task = task_graph.vertex_collection("task")
-    edges = task_graph.edge_collection("next")
+    pipeline = get_collection('pipeline')
 
     # The script
     pipe = Pipeline.from_arango(pipeline, 'test_pipeline')
-    engine = LocalEngine()
+    engine = LocalEngine(listeners=[print_event])
     engine.run(pipe)
     print(pipe)
@@ -0,0 +1,221 @@
+import json
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.cli import LIST_PAGE_SIZE, list_tasks, page_pipelines, remove_pipeline, remove_task, remove_tasks
+from backend.server.runner import run_manager
+from backend.src.cache import pipeline_cache
+from backend.src.main import Pipeline, Task, TaskGraph
+from backend.src.profiling import load_run_record
+from backend.utils import get_collection, get_db
+
+router = APIRouter()
+
+SSE_KEEPALIVE = 15  # Seconds between comments keeping an idle event stream open
+MAX_PAGE_SIZE = 1000
+
+
+class TaskIn(BaseModel):
+    name: str
+    task_type: str
+    attributes: dict = Field(default_factory=dict)  # Input attribute id -> value
+
+
+class TaskCreateIn(TaskIn):
+    upstream: list[str] = Field(default_factory=list)  # Names of the tasks of the pipeline the new one runs after
+
+
+class PipelineIn(BaseModel):
+    name: str
+    variables: dict = Field(default_factory=dict)
+    tasks: list[TaskIn] = Field(default_factory=list)
+    edges: list[tuple[str, str]] | None = None  # Pairs of task names, the tasks are chained in order without them
+
+
+def build_task(pipeline_key: str, task_in: TaskIn) -> Task:
+    if task_in.task_type not in Task.registry:
+        raise ValueError(f'Unknown task type: {task_in.task_type}')
+    task = Task.registry[task_in.task_type](pipeline_key, task_in.name)
+    task.set_input_attributes(**task_in.attributes)
+    return task
+
+
+def build_pipeline(pipeline_in: PipelineIn) -> Pipeline:
+    pipeline = Pipeline(pipeline_in.name)
+    pipeline.variables = pipeline_in.variables
+
+    tasks = {}
+    for task_in in pipeline_in.tasks:
+        tasks[task_in.name] = build_task(pipeline.key(), task_in)
+
+    edges = None
+    if pipeline_in.edges is not None:
+        unknown = {name for edge in pipeline_in.edges for name in edge} - set(tasks)
+        if unknown:
+            raise ValueError(f'Edges refer to unknown tasks: {sorted(unknown)}')
+        edges = [(tasks[from_name].key(), tasks[to_name].key()) for from_name, to_name in pipeline_in.edges]
+
+    task_graph = TaskGraph(pipeline.key(), task_ordered=list(tasks.values()), edges=edges)
+    task_graph.topological_order()  # Rejects cycles before anything is stored
+    pipeline.add(task_graph)
+    return pipeline
+
+
+async def ensure_pipeline(pipeline_key: str):
+    if not await run_in_threadpool(get_collection('pipeline').has, pipeline_key):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f'Pipeline [{pipeline_key}] does not exist')
+
+
+@router.get('/pipelines')
+async def get_pipelines(response: Response, name: str = None, with_tasks: bool = False, after: str = None,
+                        limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> list[dict]:
+    """ A page of pipelines ordered by key, the X-Next-After header is the [after] of the next page """
+    page = await run_in_threadpool(page_pipelines, name, with_tasks, after, limit)
+    if page['next_after'] is not None:
+        response.headers['X-Next-After'] = page['next_after']
+    return page['pipelines']
+
+
+@router.post('/pipelines', status_code=status.HTTP_201_CREATED)
+async def create_pipeline(pipeline_in: PipelineIn) -> dict:
+    if await run_in_threadpool(get_collection('pipeline').has, pipeline_in.name):
+        raise HTTPException(status.HTTP_409_CONFLICT, f'Pipeline [{pipeline_in.name}] already exists')
+    try:
+        pipeline = build_pipeline(pipeline_in)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+
+    await run_in_threadpool(pipeline.dump)
+    return {'key': pipeline.key()}
+
+
+@router.get('/pipelines/{pipeline_key}')
+async def get_pipeline(pipeline_key: str) -> dict:
+    """ The pipeline with its tasks and edges """
+    try:
+        pipeline = await run_in_threadpool(pipeline_cache.get, pipeline_key)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, str(e))
+    return pipeline.graph_record()
+
+
+@router.delete('/pipelines/{pipeline_key}', status_code=status.HTTP_204_NO_CONTENT)
+async def delete_pipeline(pipeline_key: str):
+    await ensure_pipeline(pipeline_key)
+    await run_in_threadpool(remove_pipeline, pipeline_key)
+
+
+@router.get('/pipelines/{pipeline_key}/tasks')
+async def get_tasks(pipeline_key: str) -> list[dict]:
+    await ensure_pipeline(pipeline_key)
+    return await run_in_threadpool(list_tasks, pipeline_key)
+
+
+@router.post('/pipelines/{pipeline_key}/tasks', status_code=status.HTTP_201_CREATED)
+async def create_task(pipeline_key: str, task_in: TaskCreateIn) -> dict:
+    """ Adds a task after the [upstream] tasks of the pipeline, the whole graph is stored by one bulk upload """
+    try:
+        pipeline = await run_in_threadpool(pipeline_cache.get, pipeline_key)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, str(e))
+
+    tasks = {task.name: task for task in pipeline}
+    if task_in.name in tasks:
+        raise HTTPException(status.HTTP_409_CONFLICT, f'Task [{task_in.name}] already exists')
+    try:
+        task = build_task(pipeline.key(), task_in)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    unknown = set(task_in.upstream) - set(tasks)
+    if unknown:
+        raise HTTPException(422, f'Upstream tasks {sorted(unknown)} do not exist')
+
+    pipeline.task_graph.task_ordered.append(task)
+    pipeline.task_graph.edges.extend((tasks[name].key(), task.key()) for name in dict.fromkeys(task_in.upstream))
+    await run_in_threadpool(pipeline.dump)  # Invalidates the cached pipeline
+    return {'key': task.key()}
+
+
+@router.delete('/pipelines/{pipeline_key}/tasks', status_code=status.HTTP_204_NO_CONTENT)
+async def delete_tasks(pipeline_key: str, keys: list[str] = Query()):
+    """ Removes several tasks at once, their predecessors are connected to their successors """
+    await ensure_pipeline(pipeline_key)
+    keys = list(dict.fromkeys(keys))  # A repeated key would be removed twice by the transaction
+    found = await run_in_threadpool(get_collection('task').get_many, keys)
+    missing = set(keys) - {task['_key'] for task in found if task['pipeline_key'] == pipeline_key}
+    if missing:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f'Tasks {sorted(missing)} do not exist')
+    await run_in_threadpool(remove_tasks, pipeline_key, keys)
+
+
+@router.delete('/pipelines/{pipeline_key}/tasks/{task_key}', status_code=status.HTTP_204_NO_CONTENT)
+async def delete_task(pipeline_key: str, task_key: str):
+    await ensure_pipeline(pipeline_key)
+    task = await run_in_threadpool(get_collection('task').get, task_key)
+    if task is None or task['pipeline_key'] != pipeline_key:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f'Task [{task_key}] does not exist')
+    await run_in_threadpool(remove_task, pipeline_key, task_key)
+
+
+@router.post('/pipelines/{pipeline_key}/runs', status_code=status.HTTP_202_ACCEPTED)
+async def start_run(pipeline_key: str, incremental: bool = False) -> dict:
+    await ensure_pipeline(pipeline_key)
+    try:
+        return run_manager.submit(pipeline_key, incremental)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_409_CONFLICT, str(e))
+
+
+@router.get('/pipelines/{pipeline_key}/runs')
+async def get_pipeline_runs(pipeline_key: str) -> list[dict]:
+    return run_manager.list(pipeline_key)
+
+
+@router.get('/runs/{run_id}')
+async def get_run(run_id: str) -> dict:
+    run = run_manager.get(run_id)
+    if run is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f'Run [{run_id}] does not exist')
+    return run
+
+
+@router.get('/runs/{run_id}/report')
+async def get_run_report(run_id: str) -> dict:
+    """ Metrics of every task of a run, available once the run is over """
+    record = await run_in_threadpool(load_run_record, get_db(), run_id)
+    if record is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f'Report of run [{run_id}] does not exist')
+    return record
+
+
+async def run_event_stream(run_id: str, since: int) -> AsyncIterator[str]:
+    done = False
+    while not done:
+        events, next_index, done = await run_manager.wait_events(run_id, since, SSE_KEEPALIVE)
+        if not events and not done:
+            yield ': keepalive\n\n'
+        for index, event in enumerate(events, start=next_index - len(events)):
+            yield f'id: {index}\nevent: {event["event"]}\ndata: {json.dumps(event)}\n\n'
+        since = next_index
+    yield f'event: end\ndata: {json.dumps(run_manager.get(run_id))}\n\n'
+
+
+@router.get('/runs/{run_id}/events')
+async def get_run_events(run_id: str, since: int = 0, last_event_id: int = Header(None)) -> StreamingResponse:
+    """ Server-sent events of a run from the [since] one, a reconnecting EventSource resumes after Last-Event-ID """
+    if run_manager.get(run_id) is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f'Run [{run_id}] does not exist')
+    if last_event_id is not None:
+        since = last_event_id + 1
+    return StreamingResponse(run_event_stream(run_id, since), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
+
+
+@router.get('/cache/pipelines')
+async def get_pipeline_cache_stats() -> dict:
+    """ Size and hit / miss counters of the pipelines cached by the server process """
+    return pipeline_cache.stats()
@@ -2,6 +2,10 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from backend.server.routes import router
+from backend.server.runner import run_manager
+from backend.utils import arango_connection
+
 fast_app = FastAPI()
 
 origins = [
@@ -19,6 +23,14 @@ fast_app.add_middleware(
     allow_headers=["*"]
 )
 
+fast_app.include_router(router)
+
+
+@fast_app.on_event('shutdown')
+def close_arango_connection():
+    run_manager.shutdown()
+    arango_connection.close()
+
 
 def run_server(port=5000):
     uvicorn.run('backend.server.run:fast_app', host='127.0.0.1', port=port)
@@ -0,0 +1,144 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from backend.src.cache import pipeline_cache
+from backend.src.main import LocalEngine
+from backend.src.models import EngineEvent, RunModel
+
+RUN_WORKERS = 4  # Pipelines executed at the same time, the rest are queued
+MAX_KEPT_RUNS = 1000  # Finished runs remembered for polling
+MAX_KEPT_EVENTS = 10_000  # Progress events remembered per run, the oldest are dropped
+FINAL_STATUSES = ('finished', 'failed')
+
+EventsPage = tuple[list[EngineEvent], int, bool]  # (events, index of the next event, the run is over)
+
+
+class RunManager:
+    """ Executes pipeline runs on a background pool, the API only registers them and reads their state """
+
+    def __init__(self, max_workers: int = RUN_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline-run')
+        self._lock = Lock()
+        self._runs: OrderedDict[str, RunModel] = OrderedDict()
+        self._active_runs: dict[str, str] = {}  # Pipeline key -> its queued or running run
+        self._events: dict[str, list[EngineEvent]] = {}
+        self._dropped_events: dict[str, int] = {}  # Count of events dropped from the start of a run`s list
+        self._waiters: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def submit(self, pipeline_key: str, incremental: bool = False) -> RunModel:
+        """
+            Registers a run of the pipeline. Runs of one pipeline share its storage and checkpoints,
+            so a run is refused while another one of the same pipeline is queued or running
+        """
+        run: RunModel = {'run_id': uuid.uuid4().hex, 'pipeline_key': pipeline_key, 'status': 'queued',
+                         'incremental': incremental, 'created_at': time.time(), 'started_at': None,
+                         'finished_at': None, 'error': None}
+        with self._lock:
+            active = self._active_runs.get(pipeline_key)
+            if active:
+                raise ValueError(f'Pipeline [{pipeline_key}] already has the {self._runs[active]["status"]} '
+                                 f'run [{active}]')
+            self._active_runs[pipeline_key] = run['run_id']
+            self._runs[run['run_id']] = run
+            self._events[run['run_id']] = []
+            self._dropped_events[run['run_id']] = 0
+            self._forget_finished()
+
+        self.executor.submit(self._execute, run['run_id'])
+        return dict(run)
+
+    def get(self, run_id: str) -> RunModel | None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            return dict(run) if run else None
+
+    def list(self, pipeline_key: str = None) -> list[RunModel]:
+        with self._lock:
+            return [dict(run) for run in self._runs.values()
+                    if pipeline_key is None or run['pipeline_key'] == pipeline_key]
+
+    def events(self, run_id: str, since: int = 0) -> EventsPage:
+        """ Events of a run starting with the [since] one """
+        with self._lock:
+            events = self._events[run_id]
+            start = max(0, since - self._dropped_events[run_id])
+            done = self._runs[run_id]['status'] in FINAL_STATUSES
+            return events[start:], self._dropped_events[run_id] + len(events), done
+
+    async def wait_events(self, run_id: str, since: int, timeout: float) -> EventsPage:
+        """ Like events(), but waits up to [timeout] seconds for a new event when there is none yet """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(run_id, []).append(waiter)
+        try:
+            events, next_index, done = self.events(run_id, since)
+            if not events and not done:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                events, next_index, done = self.events(run_id, since)
+            return events, next_index, done
+        finally:
+            with self._lock:
+                self._waiters[run_id].remove(waiter)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _update(self, run_id: str, **changes):
+        with self._lock:
+            self._runs[run_id].update(changes)
+        self._notify(run_id)
+
+    def _add_event(self, run_id: str, event: EngineEvent):
+        with self._lock:
+            events = self._events[run_id]
+            events.append(event)
+            if len(events) > MAX_KEPT_EVENTS:
+                del events[0]
+                self._dropped_events[run_id] += 1
+        self._notify(run_id)
+
+    def _notify(self, run_id: str):
+        """ Wakes the SSE streams of a run, they wait on their own event loops """
+        with self._lock:
+            waiters = list(self._waiters.get(run_id, []))
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _execute(self, run_id: str):
+        self._update(run_id, status='running', started_at=time.time())
+        try:
+            pipeline = pipeline_cache.get(self.get(run_id)['pipeline_key'])
+            engine = LocalEngine(listeners=[partial(self._add_event, run_id)], record_runs=True,
+                                 incremental=self.get(run_id)['incremental'])
+            engine.run(pipeline, run_id=run_id)
+        except Exception as e:
+            self._finish(run_id, status='failed', error=f'{e.__class__.__name__}: {e}')
+        else:
+            self._finish(run_id, status='finished')
+
+    def _finish(self, run_id: str, **changes):
+        """ Sets the final status, the pipeline accepts a new run as soon as it is visible """
+        with self._lock:
+            run = self._runs[run_id]
+            run.update(changes, finished_at=time.time())
+            self._active_runs.pop(run['pipeline_key'], None)
+        self._notify(run_id)
+
+    def _forget_finished(self):
+        finished = [run_id for run_id, run in self._runs.items() if run['status'] in FINAL_STATUSES]
+        for run_id in finished[:max(0, len(self._runs) - MAX_KEPT_RUNS)]:
+            del self._runs[run_id]
+            del self._events[run_id]
+            del self._dropped_events[run_id]
+            self._waiters.pop(run_id, None)
+
+
+run_manager = RunManager()
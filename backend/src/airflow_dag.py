@@ -0,0 +1,152 @@
+"""
+    Export of a pipeline to an Airflow DAG file: every task becomes a PythonOperator running it through the operators
+    of LocalEngine, the `next` edges become dependencies, so independent branches run on parallel Airflow workers.
+    Artifacts stay in LocalStorage, their paths and digests are passed downstream through XCom.
+    The DAG file imports `backend`, so the project has to be importable by the Airflow workers.
+    Secret attributes are never written to the file: a worker reads them from the Airflow Variable
+    `runemaster_<task key>_<attribute id>`, or from the pipeline stored in Arango when there is no such Variable.
+"""
+import keyword
+import pprint
+import re
+from pathlib import Path
+
+from backend.src.cache import pipeline_cache
+from backend.src.main import LOCAL_STORAGE_PATH, LocalEngine, LocalStorage, Pipeline, Task
+
+DAG_ID_PREFIX = 'runemaster_'
+SECRET_VARIABLE_PREFIX = 'runemaster_'
+DAG_START_DATE = '2024, 1, 1'
+
+DAG_TEMPLATE = '''"""
+    Pipeline [{pipeline_name}] of Runemaster, generated by `manage.py cli export airflow`: regenerate it instead of
+    editing. Checked offline by `airflow dags test {dag_id}`.
+"""
+from datetime import datetime
+
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+from backend.src.airflow_dag import run_airflow_task
+
+STORAGE_PATH = {storage_path!r}
+PIPELINE = {pipeline_record}
+
+with DAG(
+    dag_id={dag_id!r},
+    schedule={schedule!r},
+    start_date=datetime({start_date}),
+    catchup=False,
+    max_active_runs=1,  # Runs of a pipeline share its task directories
+    tags=['runemaster'],
+) as dag:
+{operators}
+{dependencies}
+'''
+
+OPERATOR_TEMPLATE = '''    {variable} = PythonOperator(
+        task_id={task_id!r},
+        python_callable=run_airflow_task,
+        op_kwargs={{'pipeline_record': PIPELINE, 'task_key': {task_key!r}, 'storage_path': STORAGE_PATH}},
+    )
+'''
+
+
+def airflow_id(name: str) -> str:
+    """ Airflow ids allow only letters, digits, dashes, dots and underscores """
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+def python_name(name: str) -> str:
+    name = re.sub(r'\W', '_', name)
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = f'task_{name}'
+    return name
+
+
+def task_ids(pipeline: Pipeline) -> dict[str, str]:
+    """ Task key -> Airflow task id, unique within the DAG """
+    ids = {}
+    for task in pipeline:
+        task_id = airflow_id(task.name)
+        while task_id in ids.values():
+            task_id += '_'
+        ids[task.key()] = task_id
+    return ids
+
+
+def render_dag(pipeline: Pipeline, storage_path: str = None, dag_id: str = None, schedule: str = None) -> str:
+    """ Python source of the DAG file of the pipeline """
+    ids = task_ids(pipeline)
+    variables, used_variables = {}, set()
+    for task in pipeline:
+        variable = python_name(ids[task.key()])
+        while variable in used_variables:
+            variable += '_'
+        variables[task.key()] = variable
+        used_variables.add(variable)
+
+    operators = '\n'.join(
+        OPERATOR_TEMPLATE.format(variable=variables[task.key()], task_id=ids[task.key()], task_key=task.key())
+        for task in pipeline.task_graph.topological_order()
+    )
+    dependencies = '\n'.join(f'    {variables[from_key]} >> {variables[to_key]}'
+                             for from_key, to_key in pipeline.task_graph.edges)
+    return DAG_TEMPLATE.format(
+        pipeline_name=pipeline.name,
+        dag_id=dag_id or DAG_ID_PREFIX + airflow_id(pipeline.key()),
+        storage_path=str(storage_path or LOCAL_STORAGE_PATH),
+        pipeline_record=pprint.pformat(pipeline.graph_record(), indent=4, width=100, sort_dicts=False),
+        schedule=schedule,
+        start_date=DAG_START_DATE,
+        operators=operators,
+        dependencies=dependencies,
+    )
+
+
+def write_dag(pipeline: Pipeline, path: str | Path, **options) -> Path:
+    """ Writes the DAG file, a directory [path] gets `<dag id>.py` in it """
+    path = Path(path)
+    source = render_dag(pipeline, **options)
+    compile(source, str(path), 'exec')  # A broken DAG file is never written
+    if path.is_dir():
+        path = path / f'{options.get("dag_id") or DAG_ID_PREFIX + airflow_id(pipeline.key())}.py'
+    path.write_text(source)
+    return path
+
+
+def secret_variable(task: Task, attribute_id: str) -> str:
+    """ Key of the Airflow Variable holding the value of a secret attribute of the task """
+    return f'{SECRET_VARIABLE_PREFIX}{task.key()}_{attribute_id}'
+
+
+def resolve_secrets(task: Task):
+    """ Fills the secret attributes left out of the DAG file: from Airflow Variables, otherwise from Arango """
+    from airflow.models import Variable  # Only the Airflow workers have it
+
+    resolved, stored_task = {}, None
+    for id_, attribute in task.attribute_schema.items():
+        if not attribute.get('secret') or id_ in task.attributes:
+            continue
+        try:
+            resolved[id_] = Variable.get(secret_variable(task, id_))
+        except KeyError:
+            if stored_task is None:
+                stored_task = next(stored for stored in pipeline_cache.get(task.pipeline_key)
+                                   if stored.key() == task.key())
+            if id_ in stored_task.attributes:
+                resolved[id_] = stored_task.attributes[id_]
+    task.attributes = {**task.attributes, **resolved}  # The attributes are shared with the record of the DAG file
+
+
+def run_airflow_task(pipeline_record: dict, task_key: str, storage_path: str, **context) -> dict:
+    """ The callable of the generated operators: runs a task on the artifacts its upstream operators pushed to XCom """
+    pipeline = Pipeline.from_arango_record(None, pipeline_record)
+    ids = task_ids(pipeline)
+    task = next(task for task in pipeline if task.key() == task_key)
+    resolve_secrets(task)
+
+    upstream_results = [context['ti'].xcom_pull(task_ids=ids[prev_task.key()])
+                        for prev_task in pipeline.task_graph.upstream(task)]
+    engine = LocalEngine(storage=LocalStorage(storage_path))
+    return engine.run_isolated_task(pipeline, task_key, upstream_results, run_id=context.get('run_id'))
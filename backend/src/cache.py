@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from backend.src.models import PipelineCacheStats
+from backend.utils import get_db
+
+if TYPE_CHECKING:
+    from backend.src.main import Pipeline
+
+CACHE_MAX_BYTES = 10 * 1024 ** 3
+PIPELINE_CACHE_SIZE = 128  # Loaded pipelines kept by a process
+PIPELINE_REVALIDATE_INTERVAL = 1.0  # Seconds a cached pipeline is served without checking its revision
+META_FILE_NAME = 'meta.json'
+
+
+def file_digest(path: str | Path) -> str:
+    """ Content hash of a dataset file, read chunk by chunk """
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+def result_key(task_type: str, attributes: dict, upstream_digests: list[str], fingerprint: str = '') -> str:
+    """ Identifies a task result: the task type, its attributes and the content of everything it reads """
+    payload = json.dumps(
+        {'task_type': task_type, 'attributes': attributes, 'upstream': upstream_digests, 'fingerprint': fingerprint},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def link_or_copy(source: Path, target: Path):
+    """ Hard links share the pages of a dataset, copying is the fallback between file systems """
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class ResultCache:
+    """ Content-addressed task results: [root]/<result key>/<dataset> with LRU eviction over [max_bytes] """
+
+    def __init__(self, root: str | Path, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(exist_ok=True, parents=True)
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / key
+
+    def restore(self, key: str, task_dir: Path) -> tuple[Path, str] | None:
+        """ Places a cached dataset into [task_dir], returns its path and content digest """
+        meta_path = self.entry_path(key) / META_FILE_NAME
+        with self._lock:
+            try:
+                meta = json.loads(meta_path.read_text())
+            except FileNotFoundError:
+                return None
+
+            dataset_path = task_dir / meta['file_name']
+            link_or_copy(self.entry_path(key) / meta['file_name'], dataset_path)
+            os.utime(meta_path)  # Marks the entry as recently used
+        return dataset_path, meta['digest']
+
+    def store(self, key: str, dataset_path: Path, digest: str):
+        entry = self.entry_path(key)
+        with self._lock:
+            entry.mkdir(exist_ok=True)
+            link_or_copy(dataset_path, entry / dataset_path.name)
+            (entry / META_FILE_NAME).write_text(json.dumps(
+                {'file_name': dataset_path.name, 'digest': digest, 'size': dataset_path.stat().st_size}
+            ))
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for meta_path in self.root.glob(f'*/{META_FILE_NAME}'):
+            stat = meta_path.stat()
+            entries.append((stat.st_mtime, json.loads(meta_path.read_text())['size'], meta_path.parent))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root.mkdir(exist_ok=True, parents=True)
+
+
+class PipelineCache:
+    """
+        LRU of loaded pipelines keyed by pipeline key. An entry is valid while the stored pipeline document keeps its
+        _rev: every change of a pipeline, its tasks or edges writes that document. Changes made by this process drop
+        the entry at once, changes of other processes are noticed by a revision check done once per
+        [revalidate_interval] seconds. Callers get private copies, a run changes the variables of its pipeline
+    """
+
+    def __init__(self, max_size: int = PIPELINE_CACHE_SIZE, revalidate_interval: float = PIPELINE_REVALIDATE_INTERVAL):
+        self.max_size = max_size
+        self.revalidate_interval = revalidate_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: OrderedDict[str, tuple[bytes, str, float]] = OrderedDict()  # Key -> pickle, _rev, checked at
+
+    def get(self, key: str) -> 'Pipeline':
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            snapshot, rev, checked_at = entry
+            now = time.monotonic()
+            if now - checked_at < self.revalidate_interval or self._stored_rev(key) == rev:
+                with self._lock:
+                    self.hits += 1
+                    if key in self._entries:
+                        self._entries[key] = (snapshot, rev, now)
+                        self._entries.move_to_end(key)
+                return pickle.loads(snapshot)
+
+        from backend.src.main import Pipeline  # The engine module is heavy, light commands only invalidate
+
+        pipeline = Pipeline.from_arango(None, key)
+        snapshot = pickle.dumps(pipeline)  # Unpickling is cheaper than rebuilding the tasks from the records
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (snapshot, pipeline.record['_rev'], time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return pipeline
+
+    def invalidate(self, key: str = None):
+        """ Drops a pipeline, all of them without a key """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> PipelineCacheStats:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+    @staticmethod
+    def _stored_rev(key: str) -> str | None:
+        return next(get_db().aql.execute("return document('pipeline', @key)._rev", bind_vars={'key': key}), None)
+
+
+pipeline_cache = PipelineCache()
@@ -0,0 +1,98 @@
+"""
+    Pipelines on a Dask cluster: every task is a Dask future depending on the futures of its upstream tasks and is
+    executed in a worker process by the operators of LocalEngine. Without an address a LocalCluster is started;
+    the workers of a remote cluster must share the storage path. Requires `dask[distributed]`.
+"""
+from pathlib import Path
+
+from dask.distributed import Client, Future, LocalCluster, as_completed
+
+from backend.src.main import LocalEngine, LocalStorage, Pipeline, RunContext, Task
+
+
+def run_worker_task(settings: dict, pipeline: Pipeline, run_id: str, task_key: str,
+                    upstream_results: list[dict]) -> dict:
+    """ Runs in a Dask worker: executes one task of the run with the artifacts of its upstream tasks """
+    engine = LocalEngine(storage=LocalStorage(**settings['storage']), **settings['engine'])
+    return engine.run_isolated_task(pipeline, task_key, upstream_results, run_id=run_id)
+
+
+class DaskEngine(LocalEngine):
+    """
+        LocalEngine whose tasks are scheduled on a Dask cluster instead of a thread pool. The progress events of
+        a task stay in its worker, the listeners receive the finished and failed tasks with their metrics.
+    """
+
+    def __init__(self, address: str = None, n_workers: int = None, threads_per_worker: int = 1, **settings):
+        if settings.get('incremental'):
+            raise ValueError('Incremental runs are executed by LocalEngine only')
+        # Worker processes are daemonic and can`t start a process pool, a query is scaled out as a task instead
+        settings['query_workers'] = 1
+        super().__init__(**settings)
+        self.address = address  # Scheduler of a running cluster, None starts a LocalCluster
+        self.n_workers = n_workers  # None means a worker per core
+        self.threads_per_worker = threads_per_worker
+
+        self._cluster: LocalCluster | None = None
+        self._client: Client | None = None
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            if self.address is None:
+                self._cluster = LocalCluster(n_workers=self.n_workers, threads_per_worker=self.threads_per_worker,
+                                             processes=True)
+                self._client = Client(self._cluster)
+            else:
+                self._client = Client(self.address)
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+        if self._cluster is not None:
+            self._cluster.close()
+        self._client, self._cluster = None, None
+
+    def worker_settings(self) -> dict:
+        """ What a worker needs to rebuild the engine, the listeners and the client stay in this process """
+        return {
+            'engine': {'chunk_size': self.chunk_size, 'chunk_rows': self.chunk_rows, 'use_cache': self.use_cache,
+                       'upload_channels': self.upload_channels, 'instrument': self.instrument},
+            'storage': {'os_path': str(self.storage.path), 'columnar': self.storage.columnar,
+                        'cache_max_bytes': self.storage.cache.max_bytes},
+        }
+
+    def run_graph(self, run: RunContext):
+        pipeline = run.pipeline
+        task_graph = pipeline.task_graph
+        settings = self.worker_settings()
+
+        futures: dict[str, Future] = {}
+        tasks: dict[str, Task] = {}  # Dask key -> task
+        for task in task_graph.topological_order():
+            upstream = [futures[prev_task.key()] for prev_task in task_graph.upstream(task)]
+            futures[task.key()] = self.client.submit(run_worker_task, settings, pipeline, run.run_id, task.key(),
+                                                     upstream, key=f'{pipeline.key()}-{task.key()}-{run.run_id}',
+                                                     pure=False)
+            tasks[futures[task.key()].key] = task
+
+        try:
+            for future in as_completed(list(futures.values())):
+                task = tasks[future.key]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    run.metrics[task.key()] = {'task_key': task.key(), 'task_type': task.task_type,
+                                               'status': 'failed', 'error': f'{e.__class__.__name__}: {e}'}
+                    self.emit(run, 'task_failed', task, error=run.metrics[task.key()]['error'])
+                    raise
+
+                if result['artifact'] is not None:
+                    run.artifacts[task.key()], run.digests[task.key()] = Path(result['artifact']), result['digest']
+                run.metrics[task.key()] = metrics = result['metrics']
+                pipeline.variables.update(result['variables'])
+                self.emit(run, 'task_finished', task, duration=metrics.get('wall_time'),
+                          cached=metrics['status'] == 'cached', bytes=metrics['bytes_out'], rows=metrics['rows_out'])
+        finally:
+            self.client.cancel([future for future in futures.values() if not future.done()])
@@ -1,17 +1,228 @@
-from abc import ABC
-from io import StringIO
+import hashlib
+import io
+import logging
+import mmap
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from collections import deque
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from multiprocessing import get_all_start_methods, get_context
 from pathlib import Path
+from threading import Lock
+from typing import IO, TYPE_CHECKING, Callable, Iterable, Iterator
 
 import pandas as pd
-import paramiko
-from arango import ArangoClient
+import pyarrow as pa
 from arango.collection import StandardCollection, VertexCollection
-from arango.graph import Graph
+from arango.database import StandardDatabase
+from arango.exceptions import ArangoServerError
+
+from backend.src.cache import CACHE_MAX_BYTES, ResultCache, file_digest, pipeline_cache, result_key
+from backend.src.models import EngineEvent, RunRecordModel, TaskMetrics
+from backend.src.profiling import Instrument, peak_rss, save_run_record
+from backend.src.query import Query
+from backend.utils import get_db
+
+if TYPE_CHECKING:  # paramiko is imported by the first upload only
+    from backend.src.ssh import SSHConnectionPool
 
 TaskOrderedType = list['Task']
+EdgeType = tuple[str, str]  # (upstream task key, downstream task key)
+DatasetType = str | bytes | Iterable[bytes | str] | pd.DataFrame
+CSVSourceType = str | Path | Iterable[bytes] | pd.DataFrame | pa.Table
+ProgressType = Callable[[int], None]  # Receives increments of a counter
+ListenerType = Callable[[EngineEvent], None]
+OperatorType = Callable[['LocalEngine', 'RunContext', 'Task'], None]  # Executes a task within a run of an engine
+
+TRAVERSAL_MAX_DEPTH = 10_000  # Upper bound of a task chain length when a pipeline is loaded
+
+CHUNK_SIZE = 8 * 1024 * 1024  # Bytes read from a source file per step
+CSV_CHUNK_ROWS = 500_000  # Rows parsed by pandas per step
+LOCAL_STORAGE_PATH = '/volumes/local'
+COLUMNAR_SUFFIX = '.arrow'  # Intermediate datasets stored in the Arrow IPC file format
+PROGRESS_INTERVAL = 0.5  # Seconds between two progress events of a task
+CHECKPOINT_HEAD_BYTES = 64 * 1024  # Prefix of a growing source hashed to notice it was replaced or rotated
+STATE_PREFIX = '.state-'  # Partial query results of incremental runs, one file per checkpoint generation
+PARTITION_MIN_BYTES = 64 * 1024 * 1024  # Smaller CSV files are not worth splitting between processes
+
+
+def iter_file_chunks(path: str | Path, chunk_size: int = CHUNK_SIZE, offset: int = 0,
+                     end: int = None) -> Iterator[bytes]:
+    """ Reads a file lazily, holding a single chunk in memory; [offset] / [end] limit the read byte range """
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        left = None if end is None else end - offset
+        while left is None or left > 0:
+            chunk = file.read(chunk_size if left is None else min(chunk_size, left))
+            if not chunk:
+                break
+            if left is not None:
+                left -= len(chunk)
+            yield chunk
+
+
+def last_line_end(path: str | Path, size: int, block_size: int = CHUNK_SIZE) -> int:
+    """ The offset right after the last complete line among the first [size] bytes, 0 without one """
+    with open(path, 'rb') as file:
+        position = size
+        while position > 0:
+            start = max(0, position - block_size)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def head_digest(path: str | Path, length: int) -> str:
+    """ Hash of the first bytes of a file, at most CHECKPOINT_HEAD_BYTES of them """
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read(min(length, CHECKPOINT_HEAD_BYTES))).hexdigest()
+
+
+def counted_chunks(chunks: Iterable[bytes], progress: ProgressType) -> Iterator[bytes]:
+    for chunk in chunks:
+        progress(len(chunk))
+        yield chunk
+
+
+class ProgressReporter:
+    """ Thread-safe counter reported at most once per [interval] seconds, finish() reports the final value """
+
+    def __init__(self, report: Callable[[int], None], interval: float = PROGRESS_INTERVAL):
+        self.report = report
+        self.interval = interval
+        self.total = 0
+        self._reported_total = 0
+        self._reported_at = time.monotonic()
+        self._lock = Lock()
+
+    def add(self, amount: int):
+        with self._lock:
+            self.total += amount
+            now = time.monotonic()
+            if now - self._reported_at < self.interval:
+                return
+            self._reported_at, self._reported_total = now, self.total
+            total = self.total
+        self.report(total)
+
+    def finish(self):
+        if self.total != self._reported_total:
+            self.report(self.total)
+
+
+class ChunkStreamReader(io.RawIOBase):
+    """ File-like adapter over an iterator of byte chunks, so pandas can parse a stream """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.leftover = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.leftover:
+            try:
+                self.leftover = memoryview(next(self.chunks))
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self.leftover))
+        buffer[:size] = self.leftover[:size]
+        self.leftover = self.leftover[size:]
+        return size
+
+
+@contextmanager
+def open_csv_source(csv_source: CSVSourceType) -> Iterator[IO]:
+    """ Text is parsed as is, a path is memory-mapped read-only and chunk iterators are wrapped into a stream """
+    if isinstance(csv_source, str):
+        yield StringIO(csv_source)
+    elif isinstance(csv_source, Path):
+        with open(csv_source, 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:  # An empty file can`t be mapped
+                yield file
+                return
+            # Readers of the same file share its page cache pages instead of copying them into own buffers
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    else:
+        with io.BufferedReader(ChunkStreamReader(csv_source), buffer_size=CHUNK_SIZE) as stream:
+            yield stream
+
+
+def iter_csv_frames(csv_source: CSVSourceType, columns: list[str] | None, chunk_rows: int = CSV_CHUNK_ROWS,
+                    usecols: list[str] = None, dtype: dict = None) -> Iterator[pd.DataFrame]:
+    """
+        Parsed frames of the source; columnar datasets are passed without re-parsing, only [usecols] are kept.
+        Without [columns] the first line of a CSV source is its header.
+    """
+    if isinstance(csv_source, pd.DataFrame):
+        yield csv_source[usecols] if usecols else csv_source
+        return
+    if isinstance(csv_source, pa.Table):
+        table = csv_source.select(usecols) if usecols else csv_source
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            yield batch.to_pandas()
+        return
+
+    with open_csv_source(csv_source) as csv_file:
+        yield from pd.read_csv(csv_file, names=columns, chunksize=chunk_rows, usecols=usecols, dtype=dtype)
+
+
+def csv_header(path: Path) -> tuple[list[str], int]:
+    """ Column names from the first line of a CSV file and the offset of the first data line """
+    with open(path, 'rb') as file:
+        header_line = file.readline()
+    return list(pd.read_csv(BytesIO(header_line), nrows=0).columns), len(header_line)
+
+
+def split_byte_ranges(path: Path, partitions: int, start: int = 0) -> list[tuple[int, int]]:
+    """ Byte ranges of about equal size from [start] to the end of the file, every range ends after a newline """
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, 'rb') as file:
+        for i in range(1, partitions):
+            position = max(bounds[-1], start + (size - start) * i // partitions)
+            file.seek(position)
+            file.readline()  # The line the position falls into belongs to the previous range
+            bounds.append(min(file.tell(), size))
+    bounds.append(size)
+    return [(range_start, range_end) for range_start, range_end in zip(bounds, bounds[1:]) if range_end > range_start]
+
+
+def query_partition(path: Path, start: int, end: int, query_value: str | dict, columns: list[str],
+                    chunk_rows: int) -> tuple[pd.DataFrame, int]:
+    """ Runs in a worker process: the partial result of the query over a byte range of a headerless CSV """
+    query = Query.parse(query_value)
+    rows = 0
+
+    def counted_frames():
+        nonlocal rows
+        for frame in iter_csv_frames(iter_file_chunks(path, offset=start, end=end), columns, chunk_rows,
+                                     usecols=query.source_columns(columns), dtype=query.dtypes()):
+            rows += len(frame)
+            yield frame
+
+    return query.reduce(counted_frames()), rows
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """ Forked from a clean server process, forking the threads of a running engine is not safe """
+    start_method = 'forkserver' if 'forkserver' in get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context(start_method))
 
 
 class ArangoModuleMixin(ABC):
+    __slots__ = ('record',)
 
     @classmethod
     def from_arango(cls, collection: StandardCollection, key: str):
@@ -39,25 +250,59 @@ class ArangoModuleMixin(ABC):
 
 
 class Task(ArangoModuleMixin):
-    input_attributes: list[dict]
+    """
+        Keeps only the values of its input attributes: [attributes] maps an input attribute id to its value, the schema
+        of the attributes is shared by the class. Subclasses declare `__slots__ = ()` to stay without __dict__
+    """
+    __slots__ = ('pipeline_key', 'name', 'attributes')
+
+    input_attributes: list[dict] = []
+    attribute_schema: dict[str, dict] = {}  # Input attribute id -> its entry of [input_attributes]
+    schema_version = 1  # Stored with the tasks, raised when [input_attributes] change incompatibly
+    cacheable = True  # A task without side effects, whose result depends only on its attributes and inputs
+    registry: dict[str, type['Task']] = {}  # Task type name -> class, every subclass on any depth
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        Task.registry[cls.__name__] = cls
+        cls.attribute_schema = {attr['id']: attr for attr in cls.input_attributes}
+
+    @classmethod
+    def task_class(cls, task_type: str) -> type['Task']:
+        """ Class of a stored task, types unknown to this process are loaded as plain tasks """
+        return cls.registry.get(task_type, Task)
 
     @classmethod
     def from_arango_record(cls, collection: StandardCollection, record: dict):
-        instance = cls(
-            **{k: v for k, v in record.items() if not k.startswith('_') and k not in ('attributes', 'task_type')}
-        )
-        instance.attributes = record['attributes']
+        instance = cls(record['pipeline_key'], record['name'])
+        if 'schema_version' in record:
+            instance.attributes = cls.upgrade_attributes(record['attributes'], record['schema_version'])
+        else:  # Records of the nested format keep a copy of the schema entry with every value
+            instance.attributes = {id_: attribute['value'] for id_, attribute in record['attributes'].items()}
         return instance
 
+    @classmethod
+    def upgrade_attributes(cls, attributes: dict, schema_version: int) -> dict:
+        """ Converts the attributes stored with an older [schema_version] of the task type """
+        return attributes
+
+    @classmethod
+    def public_attributes(cls, attributes: dict) -> dict:
+        """ The attributes without the secret ones (`'secret': True` in the schema), for responses and exports """
+        return {id_: value for id_, value in attributes.items() if not cls.attribute_schema.get(id_, {}).get('secret')}
+
     def __init__(self, pipeline_key: str, name: str):
         super().__init__()
         self.pipeline_key = pipeline_key
         self.name = name
-        self.attributes = {}
-        self.task_type = str(self.__class__.__name__)
+        self.attributes: dict = {}  # Input attribute id -> value
+
+    @property
+    def task_type(self) -> str:
+        return self.__class__.__name__
 
     def __rshift__(self, other):
-        if not isinstance(other, Task):
+        if not isinstance(other, (Task, list, tuple)):
             raise Exception('Unprocessable type!')
 
         return TaskGraph(self.pipeline_key, init_task=self) >> other
@@ -67,124 +312,206 @@ class Task(ArangoModuleMixin):
 
     def kwargs(self):
         return {'pipeline_key': self.pipeline_key, 'name': self.name, 'attributes': self.attributes,
-                'task_type': self.task_type}
+                'task_type': self.task_type, 'schema_version': self.schema_version}
 
     def key(self):
         return f'{self.pipeline_key}_{self.name}'
 
     def set_input_attributes(self, **input_attributes):
         for id_, value in input_attributes.items():
-            found = False
-            for source_attr in self.input_attributes:
-                if source_attr['id'] == id_:
-                    found = True
-                    break
-
-            if not found:
+            if id_ not in self.attribute_schema:
                 raise ValueError(f'An input attribute with id {id_} was not find')
-
-            self.attributes[id_] = {'input_attribute': source_attr, 'value': value}
+            self.attributes[id_] = value
 
     def insert(self, ar_task: VertexCollection) -> dict:
         self.record = ar_task.insert({'_key': self.key(), **self.kwargs()})
         return self.record
 
+    def cache_fingerprint(self) -> str:
+        """ Describes the state of external data the task reads apart from upstream datasets """
+        return ''
+
     @classmethod
-    def get_available_tasks(cls):
-        return cls.__subclasses__()
+    def get_available_tasks(cls) -> list[type['Task']]:
+        return [task_cls for task_cls in Task.registry.values() if issubclass(task_cls, cls)]
 
 
 class DownloadTask(Task):
     """ Task to load file into system """
+    __slots__ = ()
 
     input_attributes = [
         {'id': 'source', 'name': 'Source', 'type': 'choose', 'variants': ['Local File System']},
         {'id': 'path', 'name': 'Path', 'type': 'input'},
     ]
 
-    def execute(self):
-        if self.attributes['source']['value'] == 'Local File System':
-            return open(self.attributes['path']['value']).read()
+    def execute(self, chunk_size: int = CHUNK_SIZE, offset: int = 0, end: int = None) -> Iterator[bytes]:
+        """ The source bytes from [offset] to [end], incremental runs read only the new tail of a growing file """
+        if self.attributes['source'] == 'Local File System':
+            return iter_file_chunks(self.attributes['path'], chunk_size, offset=offset, end=end)
         else:
             raise ValueError('Unknown source')
 
+    def cache_fingerprint(self) -> str:
+        stat = os.stat(self.attributes['path'])
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
 
 class SSHUploadTask(Task):
     """ Task to upload file into a different file system through SSH """
+    __slots__ = ()
+    cacheable = False
 
     input_attributes = [
         {'id': 'ssh_host', 'name': 'Hostname', 'type': 'input'},
         {'id': 'ssh_user', 'name': 'User', 'type': 'input'},
-        {'id': 'ssh_password', 'name': 'Password', 'type': 'input'},
+        {'id': 'ssh_password', 'name': 'Password', 'type': 'input', 'secret': True},
         {'id': 'remote_path', 'name': 'Path On Remote Host', 'type': 'input'},
     ]
 
-    def execute(self, local_dataset_path: str | Path):
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh_client.connect(hostname=self.attributes['ssh_host']['value'],
-                           username=self.attributes['ssh_user']['value'],
-                           password=self.attributes['ssh_password']['value'])
-        ftp_client = ssh_client.open_sftp()
-        ftp_client.put(local_dataset_path, str(Path(self.attributes['remote_path']['value']) / local_dataset_path.name))
-        ftp_client.close()
+    def execute(self, local_dataset_path: str | Path, connection_pool: 'SSHConnectionPool' = None,
+                channels: int = None, progress: ProgressType = None) -> list[str]:
+        """ Uploads a dataset file or every partition file of a dataset directory, returns the remote paths """
+        from backend.src.ssh import UPLOAD_CHANNELS, SSHConnectionPool, upload_files
+
+        local_dataset_path = Path(local_dataset_path)
+        if local_dataset_path.is_dir():
+            local_paths = sorted(path for path in local_dataset_path.iterdir() if path.is_file())
+        else:
+            local_paths = [local_dataset_path]
+
+        pool = connection_pool or SSHConnectionPool()
+        try:
+            return upload_files(pool, self.attributes['ssh_host'], self.attributes['ssh_user'],
+                                self.attributes['ssh_password'], local_paths, self.attributes['remote_path'],
+                                channels=channels or UPLOAD_CHANNELS, progress=progress)
+        finally:
+            if connection_pool is None:
+                pool.close()
 
 
 class CSVQueryTask(Task):
     """ Querying CSV files in a specific language """
+    __slots__ = ()
 
     input_attributes = [
         {'id': 'columns', 'name': 'Columns', 'type': 'input', 'optional': True},
         {'id': 'query', 'name': 'Query [specific language]', 'type': 'input'},
     ]
 
-    def execute(self, csv_string: str):
-        columns = self.attributes['columns']['value'].split(',')
-        query_dict = self.attributes['query']['value']
-
-        csv_pd = pd.read_csv(StringIO(csv_string), names=columns)
-
-        csv_result = pd.DataFrame()
-        for field, (operator, add) in query_dict.items():
-            if operator == 'select':
-                if add == 'distinct':
-                    csv_result[field] = sorted(csv_pd[field].unique())
-                else:
-                    raise ValueError('Unknown addition command')
-            else:
-                raise ValueError('Unknown operator')
-
-        return csv_result.to_csv(index=False)
+    def execute(self, csv_source: CSVSourceType, chunk_rows: int = CSV_CHUNK_ROWS, progress: ProgressType = None,
+                executor: Executor = None, partitions: int = 1) -> pd.DataFrame:
+        """
+            Reads the source chunk by chunk, pruned to the columns the query needs, so only the filtered
+            partial result is kept in memory. The query is a `backend.src.query` string or dictionary,
+            the original {field: ['select', 'distinct']} dictionary gives sorted distinct rows of the fields.
+            [progress] receives the count of rows of every parsed chunk.
+            With an [executor], a CSV file is split into up to [partitions] line-aligned byte ranges queried
+            in parallel, so quoted values of such a file must not contain line breaks.
+        """
+        query, state = self.reduce(csv_source, chunk_rows, progress, executor, partitions)
+        return query.finalize(state)
+
+    def execute_incremental(self, csv_source: CSVSourceType, previous_state: pd.DataFrame | None,
+                            chunk_rows: int = CSV_CHUNK_ROWS, progress: ProgressType = None,
+                            executor: Executor = None, partitions: int = 1,
+                            header: list[str] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+            Queries only the new rows of a growing source: their partial result (distinct rows, partial
+            aggregates) is combined with the state kept for the previous rows. Returns the result and the new state.
+            [header] names the columns of a source tail without its header line when the task has no [columns].
+        """
+        query, state = self.reduce(csv_source, chunk_rows, progress, executor, partitions, header)
+        if previous_state is not None:
+            state = previous_state if state.empty else query.combine([previous_state, state])
+        return query.finalize(state), state
+
+    def reduce(self, csv_source: CSVSourceType, chunk_rows: int, progress: ProgressType = None,
+               executor: Executor = None, partitions: int = 1,
+               header: list[str] = None) -> tuple[Query, pd.DataFrame]:
+        """ The query and its combined partial result over the whole source """
+        columns_value = self.attributes.get('columns')
+        columns = columns_value.split(',') if columns_value else header
+        query = Query.parse(self.attributes['query'])
+
+        if (executor is not None and partitions > 1 and isinstance(csv_source, Path)
+                and os.path.getsize(csv_source) >= 2 * PARTITION_MIN_BYTES):
+            return query, self.reduce_partitions(query, csv_source, columns, chunk_rows, progress, executor,
+                                                 min(partitions, os.path.getsize(csv_source) // PARTITION_MIN_BYTES))
+
+        csv_frames = iter_csv_frames(csv_source, columns, chunk_rows,
+                                     usecols=query.source_columns(columns), dtype=query.dtypes())
+        if progress:
+            csv_frames = (progress(len(frame)) or frame for frame in csv_frames)
+        return query, query.reduce(csv_frames)
+
+    def reduce_partitions(self, query: Query, path: Path, columns: list[str] | None, chunk_rows: int,
+                          progress: ProgressType, executor: Executor, partitions: int) -> pd.DataFrame:
+        """ Every byte range is reduced by a worker process, the partial results are combined in file order """
+        start = 0
+        if columns is None:
+            columns, start = csv_header(path)
+
+        futures = [executor.submit(query_partition, path, range_start, range_end, self.attributes['query'],
+                                   columns, chunk_rows)
+                   for range_start, range_end in split_byte_ranges(path, partitions, start)]
+        partials = []
+        for future in futures:
+            partial, rows = future.result()
+            partials.append(partial)
+            if progress:
+                progress(rows)
+        return query.combine([partial for partial in partials if not partial.empty] or partials[:1])
 
 
 class TaskGraph:
 
     @classmethod
-    def from_arango(cls, collection: StandardCollection, pipeline_key: str, tasks: list[dict]):
-        def find_task_class_by_name(task_cls_name: str):
-            for sub_cls in Task.__subclasses__():
-                if sub_cls.__name__ == task_cls_name:
-                    return sub_cls
-            return Task
-
-        task_ordered = [
-            find_task_class_by_name(task['task_type']).from_arango_record(collection, task) for task in tasks
-        ]
-        return cls(pipeline_key, task_ordered=task_ordered)
-
-    def __init__(self, pipeline_key: str, init_task: Task = None, task_ordered: TaskOrderedType = None):
+    def from_arango(cls, collection: StandardCollection, pipeline_key: str, tasks: list[dict],
+                    edges: list[dict] = None):
+        task_ordered = [Task.task_class(task['task_type']).from_arango_record(collection, task) for task in tasks]
+        if edges is None:  # Records without edges are a plain chain in the stored order
+            return cls(pipeline_key, task_ordered=task_ordered)
+
+        graph_edges = [(edge['_from'].split('/', 1)[1], edge['_to'].split('/', 1)[1]) for edge in edges]
+        task_graph = cls(pipeline_key, task_ordered=task_ordered, edges=graph_edges)
+        task_graph.task_ordered = task_graph.topological_order()
+        return task_graph
+
+    def __init__(self, pipeline_key: str, init_task: Task = None, task_ordered: TaskOrderedType = None,
+                 edges: list[EdgeType] = None):
         self.pipeline_key = pipeline_key
         self.task_ordered: TaskOrderedType = task_ordered or []
+        if edges is None:
+            edges = [(prev.key(), task.key()) for prev, task in zip(self.task_ordered, self.task_ordered[1:])]
+        self.edges: list[EdgeType] = edges
+        self._adjacency: tuple[dict[str, TaskOrderedType], dict[str, TaskOrderedType]] = ({}, {})
+        self._adjacency_state: tuple[int, int] | None = None  # Sizes of the graph the adjacency was built for
+
+        # The tasks which the next `>>` is attached to
+        upstream_keys = {from_key for from_key, _ in self.edges}
+        self.leaves: TaskOrderedType = [task for task in self.task_ordered if task.key() not in upstream_keys]
 
         if init_task:
             if not isinstance(init_task, Task):
                 raise Exception('Unprocessable type!')
 
             self.task_ordered.append(init_task)
+            self.leaves = [init_task]
 
     def __rshift__(self, other):
+        """ `graph >> task` continues the chain, `graph >> [task, ...]` fans the leaves out into branches """
         if isinstance(other, Task):
-            self.task_ordered.append(other)
+            other = [other]
+
+        if isinstance(other, (list, tuple)):
+            if not other or not all(isinstance(task, Task) for task in other):
+                raise Exception('Unprocessable type!')
+
+            for task in other:
+                self.edges.extend((leaf.key(), task.key()) for leaf in self.leaves)
+                self.task_ordered.append(task)
+            self.leaves = list(other)
             return self
         elif isinstance(other, TaskGraph):
             if not self and other:
@@ -197,24 +524,122 @@ class TaskGraph:
     def __bool__(self):
         return bool(self.task_ordered)
 
-    def upload(self, ar_graph: Graph):
-        task = ar_graph.vertex_collection("task")
-        edges = ar_graph.edge_collection("next")
+    def adjacency(self) -> tuple[dict[str, TaskOrderedType], dict[str, TaskOrderedType]]:
+        """
+            Upstream and downstream tasks by task key, built once per state of the graph: [task_ordered] and [edges]
+            only grow, so their lengths identify the state
+        """
+        state = (len(self.task_ordered), len(self.edges))
+        if self._adjacency_state != state:
+            tasks = {task.key(): task for task in self.task_ordered}
+            upstream = {key: [] for key in tasks}
+            downstream = {key: [] for key in tasks}
+            for from_key, to_key in self.edges:
+                upstream[to_key].append(tasks[from_key])
+                downstream[from_key].append(tasks[to_key])
+            self._adjacency, self._adjacency_state = (upstream, downstream), state
+        return self._adjacency
+
+    def upstream(self, task: Task) -> TaskOrderedType:
+        return self.adjacency()[0][task.key()]
+
+    def downstream(self, task: Task) -> TaskOrderedType:
+        return self.adjacency()[1][task.key()]
+
+    def topological_order(self) -> TaskOrderedType:
+        """ Kahn`s algorithm, ties are kept in the insertion order """
+        upstream, downstream = self.adjacency()
+        waiting = {key: len(prev_tasks) for key, prev_tasks in upstream.items()}
+
+        ordered = []
+        ready = deque(task for task in self.task_ordered if not waiting[task.key()])
+        while ready:
+            task = ready.popleft()
+            ordered.append(task)
+            for next_task in downstream[task.key()]:
+                waiting[next_task.key()] -= 1
+                if not waiting[next_task.key()]:
+                    ready.append(next_task)
+
+        if len(ordered) != len(self.task_ordered):
+            raise ValueError(f'The task graph of [{self.pipeline_key}] has a cycle')
+        return ordered
+
+    def edge_records(self) -> list[dict]:
+        """ `next` records with keys derived from their ends, so re-uploading replaces instead of duplicating """
+        return [
+            {'_key': f'{from_key}-{to_key}', '_from': f'task/{from_key}', '_to': f'task/{to_key}',
+             'pipeline_key': self.pipeline_key}
+            for from_key, to_key in self.edges
+        ]
 
-        prev_task_ar = None
-        for task_instance in self.task_ordered:
-            now_task_ar = task_instance.insert(task)
-            if prev_task_ar:
-                edges.insert({"_from": prev_task_ar['_id'], "_to": now_task_ar['_id'],
-                              'pipeline_key': self.pipeline_key})
-            prev_task_ar = now_task_ar
+    def upload(self, db: StandardDatabase):
+        """ Upserts all tasks and edges with one bulk request each, then drops the records left from before """
+        task_records = [task_instance.construct_record() for task_instance in self.task_ordered]
+        edge_records = self.edge_records()
+
+        inserted = {}
+        for collection_name, records in (('task', task_records), ('next', edge_records)):
+            results = db.collection(collection_name).insert_many(records, overwrite_mode='replace') if records else []
+            errors = [result for result in results if isinstance(result, ArangoServerError)]
+            if errors:
+                raise errors[0]
+            inserted[collection_name] = results
+
+        for task_instance, task_record in zip(self.task_ordered, inserted['task']):
+            task_instance.record = task_record
+
+        db.aql.execute(
+            '''
+            let stale_edges = (
+                for e in next filter e.pipeline_key == @pipeline_key and e._key not in @edge_keys remove e in next
+            )
+            for t in task filter t.pipeline_key == @pipeline_key and t._key not in @task_keys remove t in task
+            ''',
+            bind_vars={'pipeline_key': self.pipeline_key,
+                       'task_keys': [record['_key'] for record in task_records],
+                       'edge_keys': [record['_key'] for record in edge_records]}
+        )
 
 
 class Pipeline(ArangoModuleMixin):
+    # The pipeline document with all its tasks and `next` edges: tasks are reached by a traversal of
+    # [task_graph] started from the tasks without incoming edges, the edges are the outbound ones of these tasks
+    graph_query = '''
+        let pipe = document('pipeline', @pipeline_key)
+        let roots = (
+            for t in task filter t.pipeline_key == @pipeline_key
+            filter length(for e in next filter e._to == t._id limit 1 return true) == 0
+            return t
+        )
+        let tasks = unique(
+            for root in roots
+            for v in 0..@max_depth outbound root graph 'task_graph' options {bfs: true, uniqueVertices: 'global'}
+            return v
+        )
+        let edges = (for t in tasks for v, e in 1..1 outbound t graph 'task_graph' return e)
+        filter pipe != null
+        return merge(pipe, {tasks: tasks, edges: edges})
+    '''
+
+    @classmethod
+    def from_arango(cls, collection: StandardCollection, key: str):
+        """ Loads the pipeline with its task graph in a single round trip """
+        cursor = get_db().aql.execute(cls.graph_query,
+                                      bind_vars={'pipeline_key': key, 'max_depth': TRAVERSAL_MAX_DEPTH})
+        try:
+            record = cursor.next()
+        except StopIteration:
+            raise ValueError(f'Pipeline [{key}] does not exist')
+
+        return cls.from_arango_record(collection, record)
+
     @classmethod
     def from_arango_record(cls, collection: StandardCollection, record: dict):
         instance = cls(name=record['name'])
-        task_graph = TaskGraph.from_arango(collection, pipeline_key=instance.key(), tasks=record['tasks'])
+        instance.variables = record.get('variables') or {}
+        task_graph = TaskGraph.from_arango(collection, pipeline_key=instance.key(), tasks=record['tasks'],
+                                           edges=record.get('edges'))
 
         instance.task_graph = task_graph
         instance.record = record
@@ -243,68 +668,501 @@ class Pipeline(ArangoModuleMixin):
         """ Добавляет одну таску или их цепочку / граф """
         self.task_graph = self.task_graph >> t
 
+    def graph_record(self) -> dict:
+        """
+            The pipeline with its tasks and edges in the form of `graph_query`, for responses and runs outside of
+            Arango. Secret attributes are left out, the runs outside of Arango resolve them on their own
+        """
+        tasks = [{**task.construct_record(), 'attributes': task.public_attributes(task.attributes)} for task in self]
+        return {**self.construct_record(), 'tasks': tasks, 'edges': self.task_graph.edge_records()}
+
     def dump(self):
         """ Записывает пайплайн в Арангу """
-        client = ArangoClient(hosts='http://localhost:8529')
-        db = client.db('test', username='root')
-        task_graph = db.graph("task_graph")
-        pipeline = db.collection('pipeline')
-        upd_pipe = pipeline.get({'_key': self.name})
-
-        self.task_graph.upload(task_graph)  # todo: need to insert into self.kwargs in some way..?
-        if upd_pipe and upd_pipe.result():
-            pipeline.update(self.construct_record())
-        else:
-            pipeline.insert(self.construct_record())
+        db = get_db()
+        self.task_graph.upload(db)  # todo: need to insert into self.kwargs in some way..?
+        self.record = db.collection('pipeline').insert(self.construct_record(), overwrite_mode='update')
+        pipeline_cache.invalidate(self.key())
+
+    def dump_variables(self):
+        """ Updates only the variables of the stored pipeline, e.g. the checkpoints of an incremental run """
+        self.record = get_db().collection('pipeline').update({'_key': self.key(), 'variables': self.variables},
+                                                             merge=False)
+        pipeline_cache.invalidate(self.key())
 
 
 class LocalStorage:
-    def __init__(self, os_path: str = '/volumes/local'):
+    """ Datasets of the tasks: raw files are kept as is, task results are stored columnar (Arrow IPC) """
+
+    def __init__(self, os_path: str = LOCAL_STORAGE_PATH, columnar: bool = True,
+                 cache_max_bytes: int = CACHE_MAX_BYTES):
         self.path = Path(os_path)
         self.path.mkdir(exist_ok=True, parents=True)
+        self.columnar = columnar
+        self.cache = ResultCache(self.path / '.cache', max_bytes=cache_max_bytes)
+
+        # Memory-mapped columnar datasets shared by all the tasks reading them
+        self._mapped_lock = Lock()
+        self._mapped: dict[Path, pa.Table] = {}
 
     def local_dataset_path(self, pipeline_key: str, task_key: str, file_name: str):
         return self.path / pipeline_key / task_key / file_name
 
+    @staticmethod
+    def is_columnar(dataset_path: Path) -> bool:
+        return dataset_path.name.endswith(COLUMNAR_SUFFIX)
+
+    @staticmethod
+    def native_file_name(dataset_path: Path) -> str:
+        """ The file name of the source dataset, whatever format the artifact has """
+        return dataset_path.name.removesuffix(COLUMNAR_SUFFIX)
+
     def prepare_pipeline(self, pipeline_key: str):
         (self.path / pipeline_key).mkdir(exist_ok=True)
 
     def prepare_task(self, pipeline_key: str, task_key: str):
         (self.path / pipeline_key / task_key).mkdir(exist_ok=True)
 
-    def save_dataset(self, pipeline_key: str, task_key: str, new_dataset: str, file_name: str):
-        self.local_dataset_path(pipeline_key, task_key, file_name).write_text(new_dataset)
+    def task_dir(self, pipeline_key: str, task_key: str) -> Path:
+        return self.path / pipeline_key / task_key
+
+    def save_dataset(self, pipeline_key: str, task_key: str, new_dataset: DatasetType, file_name: str) -> Path:
+        """ Writes a dataset and returns its path; chunk iterators are written one chunk at a time """
+        dataset_path = self.local_dataset_path(pipeline_key, task_key, file_name)
+        dataset_path.unlink(missing_ok=True)  # The old file may be hard linked from the result cache
+        if isinstance(new_dataset, pd.DataFrame):
+            if self.columnar:
+                dataset_path = dataset_path.with_name(dataset_path.name + COLUMNAR_SUFFIX)
+                self.write_columnar(dataset_path, new_dataset)
+            else:
+                new_dataset.to_csv(dataset_path, index=False)
+        elif isinstance(new_dataset, str):
+            dataset_path.write_text(new_dataset)
+        elif isinstance(new_dataset, bytes):
+            dataset_path.write_bytes(new_dataset)
+        else:
+            with open(dataset_path, 'wb') as file:
+                for chunk in new_dataset:
+                    file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+        return dataset_path
+
+    def write_columnar(self, dataset_path: Path, dataset: pd.DataFrame):
+        """ Written aside and renamed, so tables still mapped from the previous version stay valid """
+        table = pa.Table.from_pandas(dataset, preserve_index=False)
+        tmp_path = dataset_path.with_name(dataset_path.name + '.tmp')
+        with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, dataset_path)
+
+        with self._mapped_lock:
+            self._mapped.pop(dataset_path, None)
+
+    def read_columnar(self, dataset_path: Path) -> pa.Table:
+        """ A zero-copy table over the memory-mapped file, mapped once per dataset """
+        with self._mapped_lock:
+            if dataset_path not in self._mapped:
+                self._mapped[dataset_path] = pa.ipc.open_file(pa.memory_map(str(dataset_path), 'r')).read_all()
+            return self._mapped[dataset_path]
+
+    def release_mapped(self):
+        """ Drops the shared mappings, the pages are unmapped once no task references the tables """
+        with self._mapped_lock:
+            self._mapped.clear()
+
+    def state_path(self, pipeline_key: str, task_key: str, generation: int) -> Path:
+        return self.task_dir(pipeline_key, task_key) / f'{STATE_PREFIX}{generation}.pickle'
+
+    def save_state(self, pipeline_key: str, task_key: str, generation: int, state: pd.DataFrame):
+        """ Pickled, the partial results may hold objects such as HyperLogLog sketches """
+        state_path = self.state_path(pipeline_key, task_key, generation)
+        tmp_path = state_path.with_name(state_path.name + '.tmp')
+        state.to_pickle(tmp_path)
+        os.replace(tmp_path, state_path)
+
+    def load_state(self, pipeline_key: str, task_key: str, generation: int) -> pd.DataFrame | None:
+        state_path = self.state_path(pipeline_key, task_key, generation)
+        return pd.read_pickle(state_path) if state_path.exists() else None
+
+    def drop_states(self, pipeline_key: str, task_key: str, keep_generation: int):
+        for state_path in self.task_dir(pipeline_key, task_key).glob(f'{STATE_PREFIX}*.pickle'):
+            if state_path != self.state_path(pipeline_key, task_key, keep_generation):
+                state_path.unlink(missing_ok=True)
 
     def get_dataset(self, pipeline_key: str, task_key: str, file_name: str):
         return self.local_dataset_path(pipeline_key, task_key, file_name).read_text()
 
+    def task_input(self, dataset_path: Path) -> CSVSourceType:
+        """ What a downstream task reads: a shared mapped table for columnar datasets, the file path for raw ones """
+        if self.is_columnar(dataset_path):
+            return self.read_columnar(dataset_path)
+        return dataset_path
+
+    def as_csv(self, dataset_path: Path) -> Path:
+        """ Exports a columnar dataset to CSV next to it, batch by batch; raw datasets are returned as is """
+        if not self.is_columnar(dataset_path):
+            return dataset_path
+
+        csv_path = dataset_path.with_name(self.native_file_name(dataset_path))
+        with open(csv_path, 'w', newline='') as csv_file:
+            for i, batch in enumerate(self.read_columnar(dataset_path).to_batches()):
+                batch.to_pandas().to_csv(csv_file, header=not i, index=False)
+        return csv_path
+
+
+class RunContext:
+    """ State of a single LocalEngine run shared by its tasks """
+
+    def __init__(self, pipeline: Pipeline, run_id: str = None):
+        self.pipeline = pipeline
+        self.run_id = run_id or uuid.uuid4().hex
+        self.metrics: dict[str, TaskMetrics] = {}  # Task key -> measurements, in the order of the task starts
+        self.artifacts: dict[str, Path] = {}  # Task key -> the dataset it produced
+        self.digests: dict[str, str] = {}  # Task key -> content hash of the dataset
+        self._ssh_pool: 'SSHConnectionPool | None' = None  # Connections shared by the upload tasks of the run
+        self._ssh_pool_lock = Lock()
+        self.query_executor: ProcessPoolExecutor | None = None  # Workers shared by the partitioned queries
+
+        # Incremental runs: pipeline.variables['checkpoint'] = {'generation': int, 'sources': {task key: source}}
+        checkpoint = pipeline.variables.get('checkpoint') or {}
+        self.generation: int = checkpoint.get('generation', 0)  # States of the queries written by the last run
+        self.sources: dict[str, dict] = dict(checkpoint.get('sources', {}))  # Task key -> offset, head digest, header
+        self.resumed: set[str] = set()  # Download tasks which read only the new tail of their source
+
+    def commit_checkpoint(self) -> dict:
+        self.pipeline.variables['checkpoint'] = {'generation': self.generation + 1, 'sources': self.sources}
+        return self.pipeline.variables['checkpoint']
+
+    @property
+    def ssh_pool(self) -> 'SSHConnectionPool':
+        with self._ssh_pool_lock:
+            if self._ssh_pool is None:
+                from backend.src.ssh import SSHConnectionPool
+
+                self._ssh_pool = SSHConnectionPool()
+            return self._ssh_pool
+
+    def close(self):
+        if self._ssh_pool is not None:
+            self._ssh_pool.close()
+
+
+class Engine(ABC):
+    """
+        Runs pipelines. A task is executed by the operator registered for its type or its closest base type,
+        so task types and engines are plugged in without touching the scheduler of an engine
+    """
+    operators: dict[type[Task], OperatorType] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.operators = {}  # Own operators, the ones of the base engines are found through the MRO
 
-class LocalEngine:
-    """ Running pipeline """
-
-    def __init__(self):
-        self.storage = LocalStorage()
+    @classmethod
+    def register(cls, task_cls: type[Task]):
+        """ Decorator of an operator(engine, run, task) executing the tasks of [task_cls] in this engine """
+        def decorator(operator: OperatorType) -> OperatorType:
+            cls.operators[task_cls] = operator
+            return operator
+        return decorator
 
-    def run(self, pipeline: Pipeline):
+    @classmethod
+    def operator(cls, task: Task) -> OperatorType:
+        for task_cls in type(task).__mro__:
+            for engine_cls in cls.__mro__:
+                operator = vars(engine_cls).get('operators', {}).get(task_cls)
+                if operator is not None:
+                    return operator
+        raise ValueError(f'{cls.__name__} has no operator for {task}')
+
+    def __init__(self, listeners: list[ListenerType] = None):
+        self.listeners: list[ListenerType] = list(listeners or [])
+
+    def subscribe(self, listener: ListenerType):
+        self.listeners.append(listener)
+
+    def emit(self, run: RunContext, event: str, task: Task = None, **data):
+        """ Sends a structured event to every listener, a broken listener never breaks the run """
+        engine_event: EngineEvent = {'event': event, 'pipeline_key': run.pipeline.key(),
+                                     'task_key': task.key() if task else None, 'time': time.time(), **data}
+        for listener in self.listeners:
+            try:
+                listener(engine_event)
+            except Exception:
+                logging.exception('Engine event listener failed on %s', engine_event)
+
+    @abstractmethod
+    def run(self, pipeline: Pipeline, run_id: str = None) -> RunRecordModel:
+        """ Executes the pipeline, returns the record of the run with the metrics of every task """
+
+
+class LocalEngine(Engine):
+    """ Running pipeline: every task whose upstream tasks are finished is executed on a thread pool """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_rows: int = CSV_CHUNK_ROWS, max_workers: int = None,
+                 use_cache: bool = True, upload_channels: int = None, listeners: list[ListenerType] = None,
+                 instrument: Instrument = None, record_runs: bool = False, storage: LocalStorage = None,
+                 incremental: bool = False, query_workers: int = 1):
+        super().__init__(listeners)
+        self.storage = storage or LocalStorage()
+        self.chunk_size = chunk_size
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers  # None means the ThreadPoolExecutor default
+        self.use_cache = use_cache and not incremental  # An incremental result depends on the previous runs
+        self.incremental = incremental  # Download tasks read only what was appended since the previous run
+        # Processes querying partitions of a large CSV file, 1 keeps queries in the task threads, None is all cores
+        self.query_workers = query_workers if query_workers is not None else os.cpu_count()
+        self.upload_channels = upload_channels  # SFTP channels of a partitioned upload, None is the ssh default
+        self.instrument = instrument or Instrument()
+        self.record_runs = record_runs  # Run records are saved to the [run] collection
+
+    def progress(self, run: RunContext, event: str, task: Task, unit: str) -> ProgressReporter:
+        return ProgressReporter(lambda total: self.emit(run, event, task, **{unit: total}))
+
+    def storage_call(self, run: RunContext, task: Task, operation: str):
+        return self.instrument.storage_call(run.metrics[task.key()], operation)
+
+    def run(self, pipeline: Pipeline, run_id: str = None) -> RunRecordModel:
+        self.storage.prepare_pipeline(pipeline.key())
+        run = RunContext(pipeline, run_id)
+        record: RunRecordModel = {'_key': run.run_id, 'pipeline_key': pipeline.key(), 'started_at': time.time(),
+                                  'error': None}
+        started_at = time.perf_counter()
+        self.emit(run, 'run_started', run_id=run.run_id)
+        if self.query_workers > 1 and any(isinstance(task, CSVQueryTask) for task in pipeline):
+            run.query_executor = process_pool(self.query_workers)
+        try:
+            self.run_graph(run)
+        except Exception as e:
+            record.update(status='failed', error=f'{e.__class__.__name__}: {e}')
+            self.emit(run, 'run_failed', duration=time.perf_counter() - started_at, error=record['error'])
+            raise
+        else:
+            if self.incremental:
+                self.commit_checkpoint(run)
+            record['status'] = 'finished'
+            self.emit(run, 'run_finished', duration=time.perf_counter() - started_at)
+        finally:
+            run.close()
+            if run.query_executor is not None:
+                run.query_executor.shutdown(cancel_futures=True)
+            self.storage.release_mapped()
+
+            tasks = list(run.metrics.values())
+            # The tasks reset the high-water mark of the process, so the run peak is the highest of theirs
+            task_peaks = [metrics['peak_rss'] for metrics in tasks if 'peak_rss' in metrics]
+            record.update(finished_at=time.time(), wall_time=time.perf_counter() - started_at,
+                          peak_rss=max([peak_rss(), *task_peaks]), tasks=tasks)
+            if self.record_runs:
+                save_run_record(get_db(), record)
+        return record
+
+    def commit_checkpoint(self, run: RunContext):
+        """ The new offsets and query states become the base of the next incremental run """
+        pipeline = run.pipeline
+        checkpoint = run.commit_checkpoint()
+        if pipeline.record is not None:  # Stored pipelines keep their checkpoint in Arango
+            pipeline.dump_variables()
+        for task in pipeline:
+            if isinstance(task, CSVQueryTask):
+                self.storage.drop_states(pipeline.key(), task.key(), checkpoint['generation'])
+
+    def source_range(self, run: RunContext, task: 'DownloadTask') -> tuple[int, int | None]:
+        """
+            The byte range of the source to read in an incremental run: from the checkpoint to the end of the last
+            complete line. The whole source is read again if it doesn`t start with the checkpointed bytes anymore
+            or a downstream task has no state of the previous run to merge the tail into.
+            A source read by anything but queries is never resumed, so it is read whole and not checkpointed.
+        """
+        pipeline, path = run.pipeline, task.attributes['path']
+        downstream = pipeline.task_graph.downstream(task)
+        if not downstream or not all(isinstance(next_task, CSVQueryTask) for next_task in downstream):
+            run.sources.pop(task.key(), None)
+            return 0, None
+
+        size = os.path.getsize(path)
+        source = run.sources.get(task.key())
+        offset = 0
+        if (source and source.get('path') == path and source['offset'] <= size
+                and head_digest(path, source['offset']) == source['head_digest']):
+            if all(self.storage.state_path(pipeline.key(), next_task.key(), run.generation).exists()
+                   for next_task in downstream):
+                offset = source['offset']
+                run.resumed.add(task.key())
+        if source and not offset:
+            logging.warning('Source %s of %s has changed or has no query state, reading it again', path, task)
+
+        end = max(offset, last_line_end(path, size))  # A line being appended is read by the next run
+        # A resumed tail has no header line, the queries without [columns] read it with the checkpointed one
+        needs_header = end and any(not next_task.attributes.get('columns') for next_task in downstream)
+        header = csv_header(Path(path))[0] if needs_header else None
+        run.sources[task.key()] = {'offset': end, 'head_digest': head_digest(path, end), 'path': path,
+                                   'header': header}
+        return offset, end
+
+    def run_graph(self, run: RunContext):
+        pipeline = run.pipeline
+        task_graph = pipeline.task_graph
+
+        upstream, downstream = task_graph.adjacency()
+        waiting = {key: len(prev_tasks) for key, prev_tasks in upstream.items()}
+        finished = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=pipeline.key()) as executor:
+            running: dict[Future, Task] = {
+                executor.submit(self.run_task, run, task): task
+                for task in task_graph.task_ordered if not waiting[task.key()]
+            }
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    future.result()  # Re-raises the exception of a failed task
+                    finished += 1
+                    for next_task in downstream[task.key()]:
+                        waiting[next_task.key()] -= 1
+                        if not waiting[next_task.key()]:
+                            running[executor.submit(self.run_task, run, next_task)] = next_task
+
+        if finished != len(task_graph.task_ordered):
+            raise ValueError(f'The task graph of [{pipeline.key()}] has a cycle')
+
+    def run_isolated_task(self, pipeline: Pipeline, task_key: str, upstream_results: list[dict],
+                          run_id: str = None) -> dict:
+        """
+            Executes a single task as a step of an external scheduler. [upstream_results] are the results this method
+            returned for the upstream tasks, the returned one is JSON-serializable for the downstream tasks.
+        """
         self.storage.prepare_pipeline(pipeline.key())
-        for prev_task, task in zip([None] + list(pipeline), pipeline):
-            self.storage.prepare_task(pipeline.key(), task.key())
-            if isinstance(task, DownloadTask):
-                new_dataset = task.execute()
-                pipeline.variables['native_file_name'] = Path(task.attributes['path']['value']).name
-                self.storage.save_dataset(pipeline.key(), task.key(), new_dataset,
-                                          file_name=pipeline.variables['native_file_name'])
-            elif isinstance(task, CSVQueryTask):
-                dataset = self.storage.get_dataset(pipeline.key(), prev_task.key(),
-                                                   file_name=pipeline.variables['native_file_name'])
-                new_dataset = task.execute(dataset)
-                self.storage.save_dataset(pipeline.key(), task.key(), new_dataset,
-                                          file_name=pipeline.variables['native_file_name'])
-            elif isinstance(task, SSHUploadTask):
-                task.execute(
-                    local_dataset_path=self.storage.local_dataset_path(
-                        pipeline.key(), prev_task.key(), pipeline.variables['native_file_name']
-                    )
-                )
-            else:  # todo: Tasks
-                raise ValueError(f'We don\'t support {task}')
+        run = RunContext(pipeline, run_id)
+        for upstream_result in upstream_results:
+            if upstream_result['artifact'] is not None:
+                run.artifacts[upstream_result['task_key']] = Path(upstream_result['artifact'])
+                run.digests[upstream_result['task_key']] = upstream_result['digest']
+
+        task = next((task for task in pipeline if task.key() == task_key), None)
+        if task is None:
+            raise ValueError(f'Task [{task_key}] is not in {pipeline}')
+        try:
+            self.run_task(run, task)
+        finally:
+            run.close()
+            self.storage.release_mapped()
+
+        artifact = run.artifacts.get(task_key)
+        return {'task_key': task_key, 'artifact': str(artifact) if artifact else None,
+                'digest': run.digests.get(task_key), 'metrics': run.metrics[task_key], 'variables': pipeline.variables}
+
+    @staticmethod
+    def single_upstream(pipeline: Pipeline, task: Task) -> Task:
+        upstream = pipeline.task_graph.upstream(task)
+        if len(upstream) != 1:
+            raise ValueError(f'{task} expects exactly one upstream task, got {len(upstream)}')
+        return upstream[0]
+
+    def run_task(self, run: RunContext, task: Task):
+        metrics: TaskMetrics = {'task_key': task.key(), 'task_type': task.task_type, 'started_at': time.time(),
+                                'rows_in': 0, 'rows_out': 0, 'bytes_out': 0,
+                                'bytes_in': sum(run.artifacts[prev_task.key()].stat().st_size
+                                                for prev_task in run.pipeline.task_graph.upstream(task))}
+        run.metrics[task.key()] = metrics
+        self.emit(run, 'task_started', task, task_type=task.task_type)
+        try:
+            with self.instrument.task(metrics):
+                cached = self.run_cached_task(run, task)
+        except Exception as e:
+            metrics.update(status='failed', error=f'{e.__class__.__name__}: {e}')
+            self.emit(run, 'task_failed', task, duration=metrics.get('wall_time'), error=metrics['error'])
+            raise
+
+        artifact = run.artifacts.get(task.key())
+        if artifact:
+            metrics['bytes_out'] = max(metrics['bytes_out'], artifact.stat().st_size)
+        metrics['status'] = 'cached' if cached else 'finished'
+        self.emit(run, 'task_finished', task, duration=metrics.get('wall_time'), cached=cached,
+                  bytes=metrics['bytes_out'], rows=metrics['rows_out'])
+
+    def run_cached_task(self, run: RunContext, task: Task) -> bool:
+        """ Restores the task result from the cache or executes the task, True for a cache hit """
+        pipeline = run.pipeline
+        self.storage.prepare_task(pipeline.key(), task.key())
+
+        cache_key = None
+        if self.use_cache and task.cacheable:
+            upstream_keys = [prev_task.key() for prev_task in pipeline.task_graph.upstream(task)]
+            cache_key = result_key(task.task_type, task.attributes, [run.digests[key] for key in upstream_keys],
+                                   fingerprint=task.cache_fingerprint())
+            with self.storage_call(run, task, 'cache_restore'):
+                cached = self.storage.cache.restore(cache_key, self.storage.task_dir(pipeline.key(), task.key()))
+            if cached:
+                run.artifacts[task.key()], run.digests[task.key()] = cached
+                return True
+
+        self.execute_task(run, task)
+
+        if task.key() in run.artifacts:
+            with self.storage_call(run, task, 'digest'):
+                run.digests[task.key()] = file_digest(run.artifacts[task.key()])
+            if cache_key:
+                with self.storage_call(run, task, 'cache_store'):
+                    self.storage.cache.store(cache_key, run.artifacts[task.key()], run.digests[task.key()])
+        return False
+
+    def execute_task(self, run: RunContext, task: Task):
+        self.operator(task)(self, run, task)
+
+
+@LocalEngine.register(DownloadTask)
+def download_operator(engine: LocalEngine, run: RunContext, task: DownloadTask):
+    pipeline, metrics = run.pipeline, run.metrics[task.key()]
+    written = engine.progress(run, 'bytes_written', task, 'bytes')
+    offset, end = engine.source_range(run, task) if engine.incremental else (0, None)
+    new_dataset = counted_chunks(task.execute(chunk_size=engine.chunk_size, offset=offset, end=end), written.add)
+    pipeline.variables['native_file_name'] = Path(task.attributes['path']).name
+    with engine.storage_call(run, task, 'write'):  # The source is streamed while writing
+        run.artifacts[task.key()] = engine.storage.save_dataset(pipeline.key(), task.key(), new_dataset,
+                                                                file_name=pipeline.variables['native_file_name'])
+    written.finish()
+    metrics['bytes_in'] = written.total
+
+
+@LocalEngine.register(CSVQueryTask)
+def csv_query_operator(engine: LocalEngine, run: RunContext, task: CSVQueryTask):
+    pipeline, metrics = run.pipeline, run.metrics[task.key()]
+    processed = engine.progress(run, 'rows_processed', task, 'rows')
+    upstream_key = engine.single_upstream(pipeline, task).key()
+    prev_dataset_path = run.artifacts[upstream_key]
+    with engine.storage_call(run, task, 'read'):
+        task_input = engine.storage.task_input(prev_dataset_path)
+
+    if engine.incremental and upstream_key in run.sources:  # Reads a source tail, the state is kept
+        previous_state, header = None, None
+        if upstream_key in run.resumed:
+            with engine.storage_call(run, task, 'state_read'):
+                previous_state = engine.storage.load_state(pipeline.key(), task.key(), run.generation)
+            header = run.sources[upstream_key]['header']
+        new_dataset, state = task.execute_incremental(task_input, previous_state, chunk_rows=engine.chunk_rows,
+                                                      progress=processed.add, executor=run.query_executor,
+                                                      partitions=engine.query_workers, header=header)
+        with engine.storage_call(run, task, 'state_write'):
+            engine.storage.save_state(pipeline.key(), task.key(), run.generation + 1, state)
+    else:
+        new_dataset = task.execute(task_input, chunk_rows=engine.chunk_rows, progress=processed.add,
+                                   executor=run.query_executor, partitions=engine.query_workers)
+    processed.finish()
+    metrics['rows_in'], metrics['rows_out'] = processed.total, len(new_dataset)
+
+    with engine.storage_call(run, task, 'write'):
+        run.artifacts[task.key()] = engine.storage.save_dataset(
+            pipeline.key(), task.key(), new_dataset, file_name=engine.storage.native_file_name(prev_dataset_path)
+        )
+
+
+@LocalEngine.register(SSHUploadTask)
+def ssh_upload_operator(engine: LocalEngine, run: RunContext, task: SSHUploadTask):
+    uploaded = engine.progress(run, 'bytes_uploaded', task, 'bytes')
+    prev_dataset_path = run.artifacts[engine.single_upstream(run.pipeline, task).key()]
+    with engine.storage_call(run, task, 'export'):
+        csv_path = engine.storage.as_csv(prev_dataset_path)
+    task.execute(local_dataset_path=csv_path, connection_pool=run.ssh_pool, channels=engine.upload_channels,
+                 progress=uploaded.add)
+    uploaded.finish()
+    run.metrics[task.key()]['bytes_out'] = uploaded.total
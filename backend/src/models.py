@@ -25,9 +25,77 @@ class TaskModel(ArangoReturnDict):
     """ Collection [task] """
     pipeline_key: str
     name: str
-    attributes: dict
+    attributes: dict  # Input attribute id -> value, nested {'input_attribute': ..., 'value': ...} without a version
     task_type: str
+    schema_version: int
 
 
 class NextModel(EdgeModel):
     pipeline_key: str
+
+
+class RunModel(TypedDict):
+    """ A pipeline run started through the API """
+    run_id: str
+    pipeline_key: str
+    status: str  # queued / running / finished / failed
+    incremental: bool  # Only the data appended to the sources since the previous incremental run is read
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    error: str | None
+
+
+class EngineEvent(TypedDict, total=False):
+    """ Progress of a LocalEngine run: run_started / task_started / rows_processed / bytes_written /
+        bytes_uploaded / task_finished / task_failed / run_finished / run_failed """
+    event: str
+    pipeline_key: str
+    task_key: str | None
+    time: float
+    rows: int  # Cumulative for the task
+    bytes: int  # Cumulative for the task
+    duration: float  # Seconds
+    cached: bool
+    error: str
+
+
+class TaskMetrics(TypedDict, total=False):
+    """ Measurements of a task execution in a LocalEngine run """
+    task_key: str
+    task_type: str
+    status: str  # finished / cached / failed
+    started_at: float
+    wall_time: float  # Seconds
+    cpu_time: float  # Seconds of the thread running the task
+    storage_time: dict[str, float]  # Storage operation -> seconds
+    rows_in: int
+    rows_out: int
+    bytes_in: int
+    bytes_out: int
+    peak_rss: int  # Bytes, high-water mark of the process during the task
+    rss_growth: int  # Bytes, the peak above the resident memory at the start of the task
+    traced_peak: int  # Bytes, tracemalloc peak
+    top_allocations: list[str]
+    profile: str  # cProfile statistics
+    error: str
+
+
+class RunRecordModel(ArangoReturnDict, total=False):
+    """ Collection [run] """
+    pipeline_key: str
+    status: str  # finished / failed
+    started_at: float
+    finished_at: float
+    wall_time: float
+    peak_rss: int  # Bytes, high-water mark of the process during the run
+    tasks: list[TaskMetrics]
+    error: str | None
+
+
+class PipelineCacheStats(TypedDict):
+    """ Loaded pipelines kept by a process """
+    size: int
+    max_size: int
+    hits: int  # Requests served from the cache, revalidated ones included
+    misses: int  # Requests that loaded the pipeline from Arango
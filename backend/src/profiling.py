@@ -0,0 +1,169 @@
+import cProfile
+import io
+import json
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Iterator
+
+from arango.database import StandardDatabase
+
+from backend.src.models import RunRecordModel, TaskMetrics
+
+PROFILE_TOP = 30  # Functions kept from a cProfile capture, by cumulative time
+ALLOCATIONS_TOP = 10  # Source lines kept from a tracemalloc snapshot
+RUN_COLLECTION = 'run'
+
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+# Tasks measured at the moment: the high-water mark is process-wide, so it is reset only when none is running
+_measured_tasks = 0
+_measured_tasks_lock = Lock()
+
+
+def peak_rss() -> int:
+    """ High-water mark of the resident memory of the process since its start or the last reset, in bytes """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024  # Linux reports kilobytes
+
+
+def memory_status(field: str) -> int | None:
+    """ A memory field of /proc/self/status (VmRSS, VmHWM) in bytes, None where there is no procfs """
+    try:
+        with open(PROC_STATUS) as status:
+            for line in status:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """ Lowers the high-water mark (VmHWM and ru_maxrss) to the current RSS on Linux, elsewhere it stays as is """
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+class Instrument:
+    """
+        Hook around every task execution and storage call of LocalEngine: wall / CPU time and peak RSS.
+        The high-water mark is reset when a task starts alone, so with parallel tasks the peak covers all of them.
+        Without a reset (no procfs) the peak is the one of the process and the growth is the growth of that peak
+    """
+
+    @contextmanager
+    def task(self, metrics: TaskMetrics) -> Iterator[TaskMetrics]:
+        global _measured_tasks
+        with _measured_tasks_lock:
+            if not _measured_tasks:
+                reset_peak_rss()
+            _measured_tasks += 1
+        started_rss = memory_status('VmRSS') or peak_rss()
+
+        started_at, cpu_started_at = time.perf_counter(), time.thread_time()
+        try:
+            yield metrics
+        finally:
+            metrics['wall_time'] = time.perf_counter() - started_at
+            metrics['cpu_time'] = time.thread_time() - cpu_started_at  # Tasks run on their own threads
+            metrics['peak_rss'] = memory_status('VmHWM') or peak_rss()
+            metrics['rss_growth'] = max(0, metrics['peak_rss'] - started_rss)
+            with _measured_tasks_lock:
+                _measured_tasks -= 1
+
+    @contextmanager
+    def storage_call(self, metrics: TaskMetrics, operation: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            storage_time = metrics.setdefault('storage_time', {})
+            storage_time[operation] = storage_time.get(operation, 0) + time.perf_counter() - started_at
+
+
+class TaskProfiler(Instrument):
+    """
+        Adds a cProfile capture of the task thread and the tracemalloc peak with the top allocations.
+        Tracing is process-wide: with parallel tasks the traced peak covers all of them.
+    """
+
+    def __init__(self, profile: bool = True, trace_memory: bool = False, profile_top: int = PROFILE_TOP):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_top = profile_top
+
+        self._tracing_lock = Lock()
+        self._tracing_tasks = 0
+
+    @contextmanager
+    def task(self, metrics: TaskMetrics) -> Iterator[TaskMetrics]:
+        profiler = cProfile.Profile() if self.profile else None
+        if self.trace_memory:
+            self._start_tracing()
+        try:
+            with super().task(metrics):
+                if profiler:
+                    profiler.enable()
+                try:
+                    yield metrics
+                finally:
+                    if profiler:
+                        profiler.disable()
+        finally:
+            if self.trace_memory:  # Before the profile statistics allocate their own memory
+                metrics['traced_peak'] = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot().filter_traces(
+                    [tracemalloc.Filter(False, cProfile.__file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+                )
+                metrics['top_allocations'] = [str(stat) for stat in snapshot.statistics('lineno')[:ALLOCATIONS_TOP]]
+                self._stop_tracing()
+            if profiler:
+                metrics['profile'] = self.profile_stats(profiler)
+
+    def __getstate__(self) -> dict:
+        """ Sent to the workers of a distributed engine without the tracing state of this process """
+        return {'profile': self.profile, 'trace_memory': self.trace_memory, 'profile_top': self.profile_top}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def profile_stats(self, profiler: cProfile.Profile) -> str:
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.profile_top)
+        return output.getvalue()
+
+    def _start_tracing(self):
+        with self._tracing_lock:
+            if not self._tracing_tasks:
+                tracemalloc.start()
+            self._tracing_tasks += 1
+
+    def _stop_tracing(self):
+        with self._tracing_lock:
+            self._tracing_tasks -= 1
+            if not self._tracing_tasks:
+                tracemalloc.stop()
+
+
+def save_run_record(db: StandardDatabase, record: RunRecordModel):
+    """ Stored in the [run] collection next to the pipeline, a repeated run id replaces the record """
+    db.collection(RUN_COLLECTION).insert(record, overwrite_mode='replace', silent=True)
+
+
+def load_run_record(db: StandardDatabase, run_id: str) -> RunRecordModel | None:
+    return db.collection(RUN_COLLECTION).get(run_id)
+
+
+def export_run_record(record: RunRecordModel, path: str | Path):
+    Path(path).write_text(json.dumps(record, indent=2, default=str))
@@ -0,0 +1,663 @@
+"""
+    A small query language of CSVQueryTask.
+    The query is either a SQL subset string:
+        select a, count(*) as n where b > 3 and c in ('x', 'y') group by a order by n desc limit 10
+    or the same clauses in a dictionary:
+        {'select': ['a', 'count(*) as n'], 'where': [['b', '>', 3]], 'group_by': ['a'],
+         'order_by': [['n', 'desc']], 'limit': 10}
+    The original {field: ['select', 'distinct'], ...} dictionary is `select distinct <fields> order by <fields>`.
+    approx_count_distinct(column) estimates the number of distinct values with HyperLogLog.
+
+    Every chunk of the source is filtered and reduced to a partial result (partial aggregates, distinct rows
+    or the top rows), partial results are merged by combine() and turned into the answer by finalize().
+"""
+import re
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 14  # 2 ** 14 registers, about 0.8% standard error
+
+
+def drop_duplicate_rows(frame: pd.DataFrame) -> pd.DataFrame:
+    """ Exact vectorized dedup over all the columns at once, nulls are equal to each other """
+    if frame.empty:
+        return frame
+    return frame[~frame.duplicated().to_numpy()]
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    """ Count of leading zero bits of every uint64 """
+    values = values.copy()
+    zeros = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high_empty = (values >> np.uint64(64 - shift)) == 0
+        zeros[high_empty] += shift
+        values[high_empty] <<= np.uint64(shift)
+    zeros[values == 0] += 1  # The loop counts 63 zeros for 0
+    return zeros
+
+
+class HyperLogLog:
+    """ Mergeable approximate distinct counter """
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: np.ndarray = None):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def of_series(cls, series: pd.Series) -> 'HyperLogLog':
+        sketch = cls()
+        sketch.add_hashes(pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy())
+        return sketch
+
+    @classmethod
+    def merge_series(cls, sketches: pd.Series) -> 'HyperLogLog':
+        merged = cls()
+        for sketch in sketches:
+            if isinstance(sketch, HyperLogLog):
+                np.maximum(merged.registers, sketch.registers, out=merged.registers)
+        return merged
+
+    def add_hashes(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        precision = np.uint64(self.precision)
+        indexes = (hashes >> (np.uint64(64) - precision)).astype(np.int64)
+        ranks = np.minimum(_leading_zeros(hashes << precision), 64 - self.precision) + 1
+        np.maximum.at(self.registers, indexes, ranks.astype(np.uint8))
+
+    def estimate(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size ** 2 / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * size and empty:  # Linear counting is precise for small cardinalities
+            estimate = size * np.log(size / empty)
+        return int(round(estimate))
+
+
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'min', 'max', 'avg', 'approx_count_distinct')
+# Partial values kept per aggregate function: (kind, how chunks are reduced, how partial values are combined)
+PARTIALS = {
+    'count': (('count', 'count', 'sum'),),
+    'sum': (('sum', 'sum', 'sum'),),
+    'min': (('min', 'min', 'min'),),
+    'max': (('max', 'max', 'max'),),
+    'avg': (('sum', 'sum', 'sum'), ('count', 'count', 'sum')),
+    'approx_count_distinct': (('hll', HyperLogLog.of_series, HyperLogLog.merge_series),),
+}
+QUERY_CLAUSES = ('select', 'distinct', 'where', 'group_by', 'order_by', 'limit')
+OPERATORS = ('=', '==', '!=', '<>', '<', '<=', '>', '>=', 'in', 'not in', 'is null', 'is not null')
+COMBINE_EVERY = 16  # Partial results are merged as soon as this many are collected
+DISTINCT_COMPACT_ROWS = 1_000_000  # Collected distinct rows are never deduplicated again below this many new rows
+
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+    |(?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_.]*|`[^`]+`)
+    |(?P<op><=|>=|<>|!=|==|=|<|>)
+    |(?P<punct>[(),*])
+)""", re.VERBOSE)
+
+
+class Aggregate:
+    def __init__(self, function: str, column: str | None, alias: str = None):
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f'Unknown aggregate function: {function}')
+        if column is None and function != 'count':
+            raise ValueError(f'Aggregate {function}(*) is not supported')
+
+        self.function = function
+        self.column = column  # None stands for count(*)
+        self.alias = alias or (function if column is None else f'{function}_{column}')
+
+    def __repr__(self):
+        return f'{self.function}({self.column or "*"}) as {self.alias}'
+
+    def partial_name(self, kind: str) -> str:
+        return f'{self.alias}.{kind}'
+
+
+class Query:
+    """ A parsed query, executed chunk by chunk """
+
+    def __init__(self, columns: list[tuple[str, str]] = None, aggregates: list[Aggregate] = None,
+                 distinct: bool = False, where: list[tuple[str, str, Any]] = None, group_by: list[str] = None,
+                 order_by: list[tuple[str, bool]] = None, limit: int = None, select_order: list[str] = None):
+        self.columns = columns or []  # (source column, output name); an empty list with no aggregates means `*`
+        self.aggregates = aggregates or []
+        self.distinct = distinct
+        self.where = where or []  # (column, operator, value), combined with AND
+        self.group_by = group_by or []
+        self.order_by = order_by or []  # (output name or column, ascending)
+        self.limit = limit
+        self.select_order = select_order or [name for _, name in self.columns] + [a.alias for a in self.aggregates]
+
+        for _, operator, _ in self.where:
+            if operator not in OPERATORS:
+                raise ValueError(f'Unknown operator: {operator}')
+        if self.is_aggregate:
+            for column, _ in self.columns:
+                if column not in self.group_by:
+                    raise ValueError(f'Column [{column}] must be grouped or aggregated')
+        if self.is_aggregate or (self.distinct and self.columns):  # Only the result columns are left to order by
+            orderable = set(self.select_order) | set(self.group_by) | {column for column, _ in self.columns}
+            for name, _ in self.order_by:
+                if name not in orderable:
+                    raise ValueError(f'Cannot order by [{name}]: it is neither selected nor grouped')
+
+    def __repr__(self):
+        return (f'<Query select={self.select_order} distinct={self.distinct} where={self.where} '
+                f'group_by={self.group_by} order_by={self.order_by} limit={self.limit}>')
+
+    @property
+    def is_aggregate(self) -> bool:
+        return bool(self.aggregates or self.group_by)
+
+    @property
+    def is_select_all(self) -> bool:
+        return not self.columns and not self.is_aggregate
+
+    # Parsing
+
+    @classmethod
+    def parse(cls, query: 'str | dict | Query') -> 'Query':
+        if isinstance(query, Query):
+            return query
+        if isinstance(query, str):
+            return cls.parse_sql(query)
+        if isinstance(query, dict) and not set(query) & set(QUERY_CLAUSES):
+            return cls.from_select_distinct(query)
+        if isinstance(query, dict):
+            return cls.parse_dict(query)
+        raise ValueError(f'Unprocessable query: {query!r}')
+
+    @classmethod
+    def from_select_distinct(cls, query_dict: dict) -> 'Query':
+        """ The original {field: ['select', 'distinct']} format: distinct rows of the fields, sorted """
+        for field, (operator, add) in query_dict.items():
+            if operator != 'select':
+                raise ValueError('Unknown operator')
+            if add != 'distinct':
+                raise ValueError('Unknown addition command')
+
+        return cls(columns=[(field, field) for field in query_dict], distinct=True,
+                   order_by=[(field, True) for field in query_dict])
+
+    @classmethod
+    def parse_dict(cls, query: dict) -> 'Query':
+        unknown = set(query) - set(QUERY_CLAUSES)
+        if unknown:
+            raise ValueError(f'Unknown query clauses: {sorted(unknown)}')
+
+        parts = []
+        select = query.get('select', '*')
+        parts.append('select ' + ('distinct ' if query.get('distinct') else '') +
+                     (select if isinstance(select, str) else ', '.join(select)))
+
+        where = query.get('where')
+        if where:
+            if not isinstance(where, str):
+                where = ' and '.join(_predicate_sql(*predicate) for predicate in where)
+            parts.append(f'where {where}')
+
+        group_by = query.get('group_by')
+        if group_by:
+            parts.append('group by ' + (group_by if isinstance(group_by, str) else ', '.join(group_by)))
+
+        order_by = query.get('order_by')
+        if order_by:
+            if not isinstance(order_by, str):
+                order_by = ', '.join(item if isinstance(item, str) else ' '.join(item) for item in order_by)
+            parts.append(f'order by {order_by}')
+
+        if query.get('limit') is not None:
+            parts.append(f'limit {int(query["limit"])}')
+
+        return cls.parse_sql(' '.join(parts))
+
+    @classmethod
+    def parse_sql(cls, sql: str) -> 'Query':
+        return _Parser(sql).parse()
+
+    # Planning
+
+    def source_columns(self, columns: list[str] | None) -> list[str] | None:
+        """ Columns the source must provide, the rest is never parsed; None means all of them """
+        if self.is_select_all:
+            return None
+
+        needed = [column for column, _ in self.columns] + list(self.group_by)
+        needed += [a.column for a in self.aggregates if a.column]
+        needed += [column for column, _, _ in self.where]
+        outputs = {name for _, name in self.columns} | {a.alias for a in self.aggregates}
+        needed += [self.source_name(name) for name, _ in self.order_by if self.source_name(name) not in outputs]
+        needed = list(dict.fromkeys(needed))
+
+        if not needed:  # count(*) alone needs rows, not values
+            return columns[:1] if columns else None
+        return needed
+
+    def projected_columns(self) -> list[str]:
+        """ Source columns kept after filtering: the selected ones and the ones needed to order rows """
+        projected = [column for column, _ in self.columns]
+        if not self.distinct:
+            projected += [self.source_name(name) for name, _ in self.order_by]
+        return list(dict.fromkeys(projected))
+
+    def key_columns(self, columns: Iterable[str] = None) -> list[str]:
+        """
+            Source columns compared as keys: the grouped ones and the distinct ones, [columns] stand for `*`.
+            Columns aggregated by value stay numbers
+        """
+        keys = list(self.group_by)
+        if self.distinct and not self.is_aggregate:
+            keys += list(columns or []) if self.is_select_all else self.projected_columns()
+        valued = {a.column for a in self.aggregates if a.function not in ('count', 'approx_count_distinct')}
+        return [key for key in dict.fromkeys(keys) if key not in valued]
+
+    def dtypes(self) -> dict[str, type] | type:
+        """
+            Columns compared with strings are read as strings, so values like `007` keep their form.
+            Key columns are read as strings too: pandas infers the type of every chunk on its own, a key column
+            with a stray text value would get `7` in one chunk and `'7'` in another
+        """
+        if self.distinct and self.is_select_all:
+            return str
+        dtypes = {column: str for column, _, value in self.where
+                  if isinstance(value, str) or (isinstance(value, (list, tuple)) and
+                                                any(isinstance(v, str) for v in value))}
+        return {**dtypes, **{column: str for column in self.key_columns()}}
+
+    def source_name(self, name: str) -> str:
+        return next((column for column, output in self.columns if output == name), name)
+
+    # Execution
+
+    def filter(self, frame: pd.DataFrame) -> pd.DataFrame:
+        if not self.where:
+            return frame
+
+        mask = pd.Series(True, index=frame.index)
+        for column, operator, value in self.where:
+            series = frame[column]
+            if _is_text(series) and _is_number(value):  # Key columns are read as text
+                series = pd.to_numeric(series, errors='coerce')
+            match operator:
+                case '=' | '==':
+                    mask &= series == value
+                case '!=' | '<>':
+                    mask &= series != value
+                case '<':
+                    mask &= series < value
+                case '<=':
+                    mask &= series <= value
+                case '>':
+                    mask &= series > value
+                case '>=':
+                    mask &= series >= value
+                case 'in':
+                    mask &= series.isin(value)
+                case 'not in':
+                    mask &= ~series.isin(value)
+                case 'is null':
+                    mask &= series.isna()
+                case 'is not null':
+                    mask &= series.notna()
+        return frame[mask]
+
+    def partial(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """ Reduces a chunk of the source to the state combine() can merge """
+        frame = self.filter(frame)
+
+        if self.is_aggregate:
+            keys = self.group_by or ['.all']
+            if not self.group_by:
+                frame = frame.assign(**{'.all': 0})
+            named = {}
+            for aggregate in self.aggregates:
+                for kind, how, _ in PARTIALS[aggregate.function]:
+                    if aggregate.column is None:
+                        named[aggregate.partial_name(kind)] = (keys[0], 'size')
+                    else:
+                        named[aggregate.partial_name(kind)] = (aggregate.column, how)
+            if not named:
+                return drop_duplicate_rows(frame[keys])
+            return frame.groupby(keys, dropna=False, sort=False).agg(**named).reset_index()
+
+        if not self.is_select_all:
+            frame = frame[self.projected_columns()]
+        if self.distinct:
+            return drop_duplicate_rows(frame)
+        if self.limit is not None and self.order_by:
+            return self.sort(frame).head(self.limit)
+        if self.limit is not None:
+            return frame.head(self.limit)
+        return frame
+
+    def combine(self, partials: list[pd.DataFrame]) -> pd.DataFrame:
+        """ Merges partial results into one partial result """
+        partials = self.align_key_types(partials)
+        frame = pd.concat(partials, ignore_index=True) if len(partials) != 1 else partials[0]
+
+        if self.is_aggregate:
+            keys = self.group_by or ['.all']
+            named = {
+                aggregate.partial_name(kind): (aggregate.partial_name(kind), how)
+                for aggregate in self.aggregates for kind, _, how in PARTIALS[aggregate.function]
+            }
+            if not named:
+                return drop_duplicate_rows(frame)
+            return frame.groupby(keys, dropna=False, sort=False).agg(**named).reset_index()
+
+        if self.distinct:
+            return drop_duplicate_rows(frame)
+        if self.limit is not None and self.order_by:
+            return self.sort(frame).head(self.limit)
+        if self.limit is not None:
+            return frame.head(self.limit)
+        return frame
+
+    def align_key_types(self, partials: list[pd.DataFrame]) -> list[pd.DataFrame]:
+        """ A key column parsed as numbers in some partials (a columnar source, an older state) is compared as text """
+        partials = [partial for partial in partials if not partial.empty] or partials[:1]
+        for column in self.key_columns(partials[0].columns if partials else None):
+            if len({partial[column].dtype for partial in partials if column in partial}) > 1:
+                partials = [partial.assign(**{column: _as_text(partial[column])}) if column in partial else partial
+                            for partial in partials]
+        return partials
+
+    def infer_key_types(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """ Like a single read_csv of the whole source: a key column with only numbers in it becomes numeric """
+        for column in self.key_columns(frame.columns):
+            if column not in frame or not _is_text(frame[column]):
+                continue
+            numbers = pd.to_numeric(frame[column], errors='coerce')
+            if numbers.count() == frame[column].count():
+                frame = frame.assign(**{column: numbers})
+        return frame
+
+    def finalize(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """ Turns the combined partial result into the answer """
+        frame = self.infer_key_types(frame)
+        if self.is_aggregate:
+            if not self.group_by and frame.empty:  # Aggregates over no rows
+                frame = pd.DataFrame({
+                    aggregate.partial_name(kind): [0 if kind == 'count' else None]
+                    for aggregate in self.aggregates for kind, _, _ in PARTIALS[aggregate.function]
+                })
+            result = pd.DataFrame(index=frame.index)
+            for column, name in self.columns:
+                result[name] = frame[column]
+            for aggregate in self.aggregates:
+                if aggregate.function == 'avg':
+                    result[aggregate.alias] = (frame[aggregate.partial_name('sum')] /
+                                               frame[aggregate.partial_name('count')])
+                elif aggregate.function == 'approx_count_distinct':
+                    result[aggregate.alias] = frame[aggregate.partial_name('hll')].map(
+                        lambda sketch: sketch.estimate() if isinstance(sketch, HyperLogLog) else 0
+                    )
+                else:
+                    result[aggregate.alias] = frame[aggregate.partial_name(PARTIALS[aggregate.function][0][0])]
+            for column in self.group_by:  # Kept for ordering by keys left out of the select list
+                if column not in result:
+                    result[column] = frame[column]
+            result = self.sort(result)[self.select_order]
+        else:
+            result = self.sort(frame)
+            if not self.is_select_all:
+                result = result[[column for column, _ in self.columns]]
+                result.columns = [name for _, name in self.columns]
+
+        if self.limit is not None:
+            result = result.head(self.limit)
+        return result.reset_index(drop=True)
+
+    def sort(self, frame: pd.DataFrame) -> pd.DataFrame:
+        if not self.order_by:
+            return frame
+
+        by = [name if name in frame.columns else self.source_name(name) for name, _ in self.order_by]
+        return frame.sort_values(by=by, ascending=[ascending for _, ascending in self.order_by], kind='stable')
+
+    def is_complete(self, partial: pd.DataFrame) -> bool:
+        """ A limit without ordering is satisfied by the first rows, the rest of the source can be skipped """
+        return (self.limit is not None and not self.order_by and not self.distinct and not self.is_aggregate
+                and len(partial) >= self.limit)
+
+    def distinct_rows(self, frames: Iterable[pd.DataFrame]) -> pd.DataFrame:
+        """
+            Distinct rows in amortized linear time: every chunk is deduplicated on its own, and the collected rows
+            are deduplicated again only once the rows added since the last pass outnumber the kept ones
+        """
+        collected, kept_rows, added_rows = [], 0, 0
+        for frame in frames:
+            rows = self.partial(frame)
+            if rows.empty:
+                continue
+            collected.append(rows)
+            added_rows += len(rows)
+            if added_rows > max(kept_rows, DISTINCT_COMPACT_ROWS):
+                collected = [drop_duplicate_rows(pd.concat(collected, ignore_index=True))]
+                kept_rows, added_rows = len(collected[0]), 0
+
+        if not collected:
+            return self.partial(pd.DataFrame(columns=self.source_columns(None) or []))
+        return drop_duplicate_rows(pd.concat(collected, ignore_index=True)).reset_index(drop=True)
+
+    def reduce(self, frames: Iterable[pd.DataFrame]) -> pd.DataFrame:
+        """ The combined partial result of all the frames, it can be combined with the state of other sources """
+        if self.distinct and not self.is_aggregate:
+            return self.distinct_rows(frames)
+
+        partials = []
+        for frame in frames:
+            partials.append(self.partial(frame))
+            if len(partials) >= COMBINE_EVERY or self.limit is not None:
+                partials = [self.combine(partials)]
+                if self.is_complete(partials[0]):
+                    break
+
+        if not partials:
+            return self.partial(pd.DataFrame(columns=self.source_columns(None) or []))
+        return self.combine(partials)
+
+
+def _is_number(value: Any) -> bool:
+    """ A numeric literal or a list of them """
+    if isinstance(value, (list, tuple)):
+        return bool(value) and all(_is_number(item) for item in value)
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_text(series: pd.Series) -> bool:
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    """ Values as read_csv keeps them when a column is read as strings: `7` for integral numbers, nulls stay """
+    def text(value: Any) -> str:
+        return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+
+    return series.map(text, na_action='ignore').astype(object)
+
+
+def _literal_sql(value: Any) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, (list, tuple)):
+        return '(' + ', '.join(map(_literal_sql, value)) + ')'
+    return repr(value)
+
+
+def _predicate_sql(column: str, operator: str, value: Any = None) -> str:
+    if operator in ('is null', 'is not null'):
+        return f'{column} {operator}'
+    return f'{column} {operator} {_literal_sql(value)}'
+
+
+class _Parser:
+    """ Recursive descent over the tokens of the SQL subset """
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = self.tokenize(sql)
+        self.position = 0
+
+    @staticmethod
+    def tokenize(sql: str) -> list[tuple[str, Any]]:
+        tokens, position = [], 0
+        sql = sql.strip()
+        while position < len(sql):
+            match = TOKEN_RE.match(sql, position)
+            if not match or match.end() == position:
+                raise ValueError(f'Unexpected symbol in the query at {position}: {sql[position:position + 20]!r}')
+            position = match.end()
+            kind = match.lastgroup
+            text = match.group(kind)
+            if kind == 'string':
+                tokens.append(('literal', text[1:-1].replace(text[0] * 2, text[0])))
+            elif kind == 'number':
+                tokens.append(('literal', float(text) if any(c in text for c in '.eE') else int(text)))
+            elif kind == 'name' and text.startswith('`'):
+                tokens.append(('name', text[1:-1]))
+            elif kind == 'name' and text.lower() in ('null', 'true', 'false'):
+                tokens.append(('literal', {'null': None, 'true': True, 'false': False}[text.lower()]))
+            else:
+                tokens.append((kind, text))
+        return tokens
+
+    def peek(self, offset: int = 0) -> tuple[str, Any] | None:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def is_keyword(self, *words: str) -> bool:
+        return all(
+            (token := self.peek(i)) is not None and token[0] == 'name' and token[1].lower() == word
+            for i, word in enumerate(words)
+        )
+
+    def accept(self, *words: str) -> bool:
+        if self.is_keyword(*words):
+            self.position += len(words)
+            return True
+        return False
+
+    def expect(self, *words: str):
+        if not self.accept(*words):
+            raise ValueError(f'Expected [{" ".join(words)}] in the query: {self.sql}')
+
+    def accept_punct(self, symbol: str) -> bool:
+        if self.peek() == ('punct', symbol):
+            self.position += 1
+            return True
+        return False
+
+    def name(self) -> str:
+        token = self.peek()
+        if token is None or token[0] != 'name':
+            raise ValueError(f'Expected a column name in the query: {self.sql}')
+        self.position += 1
+        return token[1]
+
+    def literal(self) -> Any:
+        token = self.peek()
+        if token is None or token[0] != 'literal':
+            raise ValueError(f'Expected a value in the query: {self.sql}')
+        self.position += 1
+        return token[1]
+
+    def parse(self) -> Query:
+        self.accept('select')
+        distinct = self.accept('distinct')
+
+        columns, aggregates, select_order = [], [], []
+        if not self.accept_punct('*'):
+            while True:
+                item = self.select_item()
+                if isinstance(item, Aggregate):
+                    aggregates.append(item)
+                    select_order.append(item.alias)
+                else:
+                    columns.append(item)
+                    select_order.append(item[1])
+                if not self.accept_punct(','):
+                    break
+
+        if self.accept('from'):
+            self.name()  # The source is the upstream dataset whatever it is called
+
+        where = []
+        if self.accept('where'):
+            where.append(self.predicate())
+            while self.accept('and'):
+                where.append(self.predicate())
+
+        group_by = []
+        if self.accept('group', 'by'):
+            group_by.append(self.name())
+            while self.accept_punct(','):
+                group_by.append(self.name())
+
+        order_by = []
+        if self.accept('order', 'by'):
+            while True:
+                column = self.name()
+                ascending = not self.accept('desc')
+                if ascending:
+                    self.accept('asc')
+                order_by.append((column, ascending))
+                if not self.accept_punct(','):
+                    break
+
+        limit = None
+        if self.accept('limit'):
+            limit = self.literal()
+            if not isinstance(limit, int) or limit < 0:
+                raise ValueError(f'Limit must be a non-negative integer: {limit}')
+
+        if self.peek() is not None:
+            raise ValueError(f'Unexpected [{self.peek()[1]}] in the query: {self.sql}')
+
+        return Query(columns=columns, aggregates=aggregates, distinct=distinct, where=where, group_by=group_by,
+                     order_by=order_by, limit=limit, select_order=select_order)
+
+    def select_item(self) -> Aggregate | tuple[str, str]:
+        name = self.name()
+        if name.lower() in AGGREGATE_FUNCTIONS and self.accept_punct('('):
+            column = None if self.accept_punct('*') else self.name()
+            if not self.accept_punct(')'):
+                raise ValueError(f'Expected [)] in the query: {self.sql}')
+            alias = self.name() if self.accept('as') else None
+            return Aggregate(name.lower(), column, alias)
+
+        alias = self.name() if self.accept('as') else name
+        return name, alias
+
+    def predicate(self) -> tuple[str, str, Any]:
+        column = self.name()
+        if self.accept('is'):
+            operator = 'is not null' if self.accept('not') else 'is null'
+            if self.peek() != ('literal', None):  # `null` is tokenized as a literal
+                raise ValueError(f'Expected [null] after [is] in the query: {self.sql}')
+            self.position += 1
+            return column, operator, None
+
+        operator = 'not in' if self.accept('not', 'in') else 'in' if self.accept('in') else None
+        if operator:
+            if not self.accept_punct('('):
+                raise ValueError(f'Expected [(] in the query: {self.sql}')
+            values = [self.literal()]
+            while self.accept_punct(','):
+                values.append(self.literal())
+            if not self.accept_punct(')'):
+                raise ValueError(f'Expected [)] in the query: {self.sql}')
+            return column, operator, values
+
+        token = self.peek()
+        if token is None or token[0] != 'op':
+            raise ValueError(f'Expected a comparison after [{column}] in the query: {self.sql}')
+        self.position += 1
+        return column, token[1], self.literal()
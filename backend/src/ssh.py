@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from threading import Lock
+from typing import Callable, Iterator
+
+import paramiko
+
+SSH_WINDOW_SIZE = 64 * 1024 * 1024  # Flow control window of a channel, paramiko`s default is 2MB
+SSH_REKEY_BYTES = 2 ** 40  # Rekeying stalls a transfer, paramiko rekeys every 512MB by default
+SFTP_BLOCK_SIZE = 1024 * 1024  # Local read size, the writes are pipelined without waiting for each ack
+UPLOAD_CHANNELS = 4  # SFTP channels used in parallel for a partitioned dataset
+UPLOAD_RETRIES = 3  # Attempts after a broken transfer, each one resumes from the uploaded part
+PARTIAL_SUFFIX = '.part'  # Uploads go to a temporary name and are renamed once verified
+
+ConnectionKey = tuple[str, str]  # (host, user)
+
+
+class SSHConnectionPool:
+    """ Authenticated SSH transports keyed by host and user, every SFTP session is a cheap channel over them """
+
+    def __init__(self, window_size: int = SSH_WINDOW_SIZE):
+        self.window_size = window_size
+        self._lock = Lock()
+        self._clients: dict[ConnectionKey, paramiko.SSHClient] = {}
+        self._connect_locks: dict[ConnectionKey, Lock] = {}
+
+    def client(self, host: str, user: str, password: str = None) -> paramiko.SSHClient:
+        key = (host, user)
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, Lock())
+
+        with connect_lock:  # Only one handshake per key, other hosts are connected meanwhile
+            ssh_client = self._clients.get(key)
+            if ssh_client is not None and ssh_client.get_transport() and ssh_client.get_transport().is_active():
+                return ssh_client
+
+            ssh_client = paramiko.SSHClient()
+            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh_client.connect(hostname=host, username=user, password=password)
+
+            transport = ssh_client.get_transport()
+            transport.default_window_size = self.window_size
+            transport.packetizer.REKEY_BYTES = SSH_REKEY_BYTES
+            transport.set_keepalive(30)
+
+            with self._lock:
+                self._clients[key] = ssh_client
+            return ssh_client
+
+    @contextmanager
+    def sftp(self, host: str, user: str, password: str = None) -> Iterator[paramiko.SFTPClient]:
+        sftp_client = self.client(host, user, password).open_sftp()
+        try:
+            yield sftp_client
+        finally:
+            sftp_client.close()
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for ssh_client in clients:
+            ssh_client.close()
+
+
+def remote_sha256(ssh_client: paramiko.SSHClient | None, sftp_client: paramiko.SFTPClient, remote_path: str,
+                  length: int = 0) -> str | None:
+    """
+        Hex sha256 of the first [length] bytes (0 - the whole file) computed on the remote host:
+        the `check-file` SFTP extension or `sha256sum` over an exec channel. None if neither is available.
+    """
+    try:
+        with sftp_client.open(remote_path, 'r') as remote_file:
+            return remote_file.check('sha256', 0, length, 0).hex()
+    except (IOError, paramiko.SSHException):
+        pass
+
+    if ssh_client is None:
+        return None
+    quoted_path = shlex.quote(remote_path)
+    command = f'head -c {length} -- {quoted_path} | sha256sum' if length else f'sha256sum -- {quoted_path}'
+    try:
+        _, stdout, _ = ssh_client.exec_command(command)
+        output = stdout.read().decode()
+        if stdout.channel.recv_exit_status() != 0 or not output:
+            return None
+    except paramiko.SSHException:
+        return None
+    return output.split()[0]
+
+
+def _remote_size(sftp_client: paramiko.SFTPClient, remote_path: str) -> int | None:
+    try:
+        return sftp_client.stat(remote_path).st_size
+    except FileNotFoundError:
+        return None
+
+
+def _hash_prefix(local_file, length: int, block_size: int) -> 'hashlib._Hash':
+    digest = hashlib.sha256()
+    while length > 0 and (block := local_file.read(min(block_size, length))):
+        digest.update(block)
+        length -= len(block)
+    return digest
+
+
+def put_file(sftp_client: paramiko.SFTPClient, local_path: str | Path, remote_path: str,
+             block_size: int = SFTP_BLOCK_SIZE, ssh_client: paramiko.SSHClient = None,
+             progress: Callable[[int], None] = None):
+    """
+        Resumable, verified upload. Data goes to `<remote_path>.part`; an existing partial file whose content
+        matches the local prefix is continued from its size. The writes are pipelined, the local checksum is
+        computed in the same pass and compared with the remote one before the atomic rename.
+        [progress] receives the size of every block sent.
+    """
+    local_size = os.path.getsize(local_path)
+    partial_path = remote_path + PARTIAL_SUFFIX
+
+    with open(local_path, 'rb') as local_file:
+        offset = _remote_size(sftp_client, partial_path) or 0
+        if offset > local_size:
+            offset = 0
+
+        digest = _hash_prefix(local_file, offset, block_size)
+        if offset:
+            remote_prefix = remote_sha256(ssh_client, sftp_client, partial_path, offset)
+            if remote_prefix is not None and remote_prefix != digest.hexdigest():
+                logging.warning('Partial upload %s does not match %s, starting over', partial_path, local_path)
+                offset, digest = 0, hashlib.sha256()
+                local_file.seek(0)
+
+        with sftp_client.open(partial_path, 'r+' if offset else 'w') as remote_file:
+            remote_file.seek(offset)
+            remote_file.set_pipelined(True)
+            while block := local_file.read(block_size):
+                digest.update(block)
+                remote_file.write(block)
+                if progress:
+                    progress(len(block))
+
+    remote_digest = remote_sha256(ssh_client, sftp_client, partial_path)
+    if remote_digest is None:  # Nothing to hash with on the remote side, the size is the only check left
+        if _remote_size(sftp_client, partial_path) != local_size:
+            raise IOError(f'Uploaded size of {remote_path} differs from {local_path}')
+    elif remote_digest != digest.hexdigest():
+        sftp_client.remove(partial_path)
+        raise IOError(f'Checksum of the uploaded {remote_path} differs from {local_path}')
+
+    try:
+        sftp_client.posix_rename(partial_path, remote_path)
+    except IOError:  # The server has no posix-rename extension, plain rename doesn`t overwrite
+        if _remote_size(sftp_client, remote_path) is not None:
+            sftp_client.remove(remote_path)
+        sftp_client.rename(partial_path, remote_path)
+
+
+def upload_files(pool: SSHConnectionPool, host: str, user: str, password: str, local_paths: list[Path],
+                 remote_dir: str, channels: int = UPLOAD_CHANNELS, retries: int = UPLOAD_RETRIES,
+                 progress: Callable[[int], None] = None) -> list[str]:
+    """ Uploads files over up to [channels] SFTP channels of one pooled connection, broken transfers resume """
+
+    def upload(local_path: Path) -> str:
+        remote_path = str(PurePosixPath(remote_dir) / local_path.name)
+        for attempt in range(retries + 1):
+            try:
+                with pool.sftp(host, user, password) as sftp_client:
+                    put_file(sftp_client, local_path, remote_path, ssh_client=pool.client(host, user, password),
+                             progress=progress)
+                return remote_path
+            except (EOFError, ConnectionError, paramiko.SSHException) as e:
+                if attempt == retries:
+                    raise
+                logging.warning('Upload of %s is broken (%s), resuming', local_path, e)
+
+    if len(local_paths) == 1:
+        return [upload(local_paths[0])]
+
+    pool.client(host, user, password)  # Connects once before the channels are opened in parallel
+    with ThreadPoolExecutor(max_workers=max(1, min(channels, len(local_paths)))) as executor:
+        return list(executor.map(upload, local_paths))
@@ -1,17 +1,91 @@
+import os
+from threading import Lock
+
 from arango import ArangoClient
 from arango.collection import StandardCollection
 from arango.database import StandardDatabase
+from arango.http import DefaultHTTPClient
+from requests import Session
+from requests.adapters import HTTPAdapter
 
+ARANGO_HOSTS = os.environ.get('ARANGO_HOSTS', 'http://localhost:8529')  # Comma separated for a cluster
+ARANGO_DB = os.environ.get('ARANGO_DB', 'test')
+ARANGO_USER = os.environ.get('ARANGO_USER', 'root')
+ARANGO_PASSWORD = os.environ.get('ARANGO_PASSWORD', '')
+ARANGO_POOL_SIZE = int(os.environ.get('ARANGO_POOL_SIZE', '16'))
 
-def get_db() -> StandardDatabase:
-    """ Add client invocation to collections get """
-    client = ArangoClient(hosts="http://localhost:8529")
-    return client.db("test", username="root")
 
+class PooledHTTPClient(DefaultHTTPClient):
+    """ Keep-alive session with a connection pool big enough for the engine and server threads """
 
-def get_collection(collection_name: str) -> StandardCollection:
-    """ Add client invocation to collections get """
-    client = ArangoClient(hosts="http://localhost:8529")
-    db = client.db("test", username="root")
+    def __init__(self, pool_size: int = ARANGO_POOL_SIZE):
+        self.pool_size = pool_size
+
+    def create_session(self, host: str) -> Session:
+        session = super().create_session(host)
+        http_adapter = HTTPAdapter(max_retries=session.get_adapter(host).max_retries,
+                                   pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', http_adapter)
+        session.mount('http://', http_adapter)
+        return session
+
+
+class ArangoConnectionManager:
+    """ Process-wide ArangoClient, its databases are reused by the CLI, pipelines and the server """
+
+    def __init__(self, hosts: str = ARANGO_HOSTS, db_name: str = ARANGO_DB, username: str = ARANGO_USER,
+                 password: str = ARANGO_PASSWORD, pool_size: int = ARANGO_POOL_SIZE):
+        self.hosts = hosts
+        self.db_name = db_name
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+
+        self._lock = Lock()
+        self._client: ArangoClient | None = None
+        self._databases: dict[tuple[str, str, str], StandardDatabase] = {}
+
+    def configure(self, **settings):
+        """ Changes hosts / credentials, the existing sessions are closed """
+        self.close()
+        for name, value in settings.items():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise ValueError(f'Unknown connection setting: {name}')
+            setattr(self, name, value)
+
+    @property
+    def client(self) -> ArangoClient:
+        with self._lock:
+            if self._client is None:
+                self._client = ArangoClient(hosts=self.hosts.split(','),
+                                            http_client=PooledHTTPClient(self.pool_size))
+            return self._client
 
-    return db.collection(collection_name)
+    def db(self, name: str = None, username: str = None, password: str = None) -> StandardDatabase:
+        db_key = (name or self.db_name, username or self.username,
+                  self.password if password is None else password)
+        client = self.client
+        with self._lock:
+            if db_key not in self._databases:
+                self._databases[db_key] = client.db(db_key[0], username=db_key[1], password=db_key[2])
+            return self._databases[db_key]
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._databases.clear()
+
+
+arango_connection = ArangoConnectionManager()
+
+
+def get_db(name: str = None, username: str = None, password: str = None) -> StandardDatabase:
+    """ A database of the shared connection """
+    return arango_connection.db(name, username, password)
+
+
+def get_collection(collection_name: str) -> StandardCollection:
+    """ A collection of the shared connection """
+    return get_db().collection(collection_name)
@@ -1,17 +1,19 @@
-from arango import ArangoClient
+from backend.utils import get_db
 
 if __name__ == '__main__':
-    client = ArangoClient(hosts="http://localhost:8529")
-    sys_db = client.db("_system", username="root", password="passwd")
+    sys_db = get_db("_system", password="passwd")
 
     if not sys_db.has_database('test'):
         sys_db.create_database("test")
 
-    db = client.db("test", username="root")
+    db = get_db()
 
     if not db.has_collection('pipeline'):
         db.create_collection("pipeline")
 
+    if not db.has_collection('run'):
+        db.create_collection("run")
+
     task_graph = db.create_graph("task_graph")
     task = task_graph.create_vertex_collection("task")
     edges = task_graph.create_edge_definition(
@@ -19,3 +21,8 @@ if __name__ == '__main__':
         from_vertex_collections=["task"],
         to_vertex_collections=["task"]
     )
+
+    # Listings and pipeline loading filter by these fields, the `next` edges are also found by their _from / _to
+    db.collection('task').add_persistent_index(fields=['pipeline_key'], name='task_pipeline_key')
+    db.collection('next').add_persistent_index(fields=['pipeline_key'], name='next_pipeline_key')
+    db.collection('pipeline').add_persistent_index(fields=['name'], name='pipeline_name')
@@ -2,29 +2,36 @@
     Run specific service.
     Run CLI example:
         > python manage.py cli list
+        > python manage.py cli run pipeline --pipeline test_pipeline --no-cache
+        > python manage.py cli run pipeline --pipeline test_pipeline --profile --trace-memory --report run.json
+        > python manage.py cli run pipeline --pipeline test_pipeline --incremental --query-workers 32
+        > python manage.py cli run pipeline --pipeline test_pipeline --engine dask [--dask-address tcp://host:8786]
+        > python manage.py cli export run --run <run id> --path run.json
+        > python manage.py cli export airflow --pipeline test_pipeline --path ~/airflow/dags [--schedule @daily]
         > python manage.py backend run
 """
 import sys
-from typing import Type
+from typing import TYPE_CHECKING, Type
 
-from backend.cli import list_pipelines, list_tasks, remove_pipeline, remove_task
-from backend.server.run import run_server
-from backend.src.main import Pipeline, Task
+from backend.cli import iter_pipelines, remove_pipeline, remove_task
 from backend.src.models import TaskModel
-from backend.utils import get_collection
+from backend.utils import get_collection, get_db
+
+if TYPE_CHECKING:  # The engine (pandas, pyarrow) and the server are imported by the commands using them
+    from backend.src.main import Pipeline, Task
 
 
 def show_pipelines():
     print('Existed pipelines:')
-    for p in list_pipelines():
+    for p in iter_pipelines():
         print(f' - Pipeline [{p["name"]}]: tasks: {p["tasks"]}')
 
 
 def show_tasks(pipeline: str = None):
     print('Pipelines / tasks:')
-    for p in list_pipelines(pipeline):
+    for p in iter_pipelines(pipeline, with_tasks=True):
         print(f' - Pipeline [{p["name"]}]:')
-        for t in list_tasks(p['key']):
+        for t in p['task_list']:
             print(f'    - Task [{t["name"]}]: {t["task_type"]}')
 
 
@@ -57,14 +64,82 @@ def show_rm_task(pipeline: str, task: str):
     print(f'Task [{pipeline}:{task}] is removed')
 
 
-def add_another_task(new_pipeline: Pipeline):
+def show_run_pipeline(pipeline: str, no_cache: bool = False, profile: bool = False, trace_memory: bool = False,
+                      report: str = None, incremental: bool = False, query_workers: str = '1', engine: str = 'local',
+                      dask_address: str = None):
+    try:
+        pipe_record = get_collection('pipeline').find({'name': pipeline}).next()
+    except StopIteration:
+        print('Wrong pipeline name to run:', pipeline)
+        return
+
+    from backend.src.main import LocalEngine, Pipeline
+    from backend.src.profiling import TaskProfiler, export_run_record
+
+    pipe = Pipeline.from_arango(get_collection('pipeline'), pipe_record['_key'])
+    instrument = TaskProfiler(profile=profile, trace_memory=trace_memory) if profile or trace_memory else None
+    settings = {'use_cache': not no_cache, 'instrument': instrument, 'record_runs': True, 'incremental': incremental,
+                'query_workers': int(query_workers)}
+    if engine == 'dask':
+        from backend.src.dask_engine import DaskEngine  # Dask is an optional dependency
+
+        dask_engine = DaskEngine(address=dask_address, **settings)
+        try:
+            run_record = dask_engine.run(pipe)
+        finally:
+            dask_engine.close()
+    elif engine == 'local':
+        run_record = LocalEngine(**settings).run(pipe)
+    else:
+        print('Wrong engine name:', engine)
+        return
+    print(f'Pipeline [{pipeline}] is finished, run [{run_record["_key"]}] in {run_record["wall_time"]:.2f}s')
+    for metrics in run_record['tasks']:
+        print(f' - Task [{metrics["task_key"]}]: {metrics["status"]}, {metrics["wall_time"]:.2f}s wall, '
+              f'{metrics["cpu_time"]:.2f}s CPU, rows {metrics["rows_in"]} -> {metrics["rows_out"]}, '
+              f'bytes {metrics["bytes_in"]} -> {metrics["bytes_out"]}, peak RSS {metrics["peak_rss"]}')
+    if report:
+        export_run_record(run_record, report)
+        print(f'Run report is exported to {report}')
+
+
+def show_export_run(run: str, path: str):
+    from backend.src.profiling import export_run_record, load_run_record
+
+    run_record = load_run_record(get_db(), run)
+    if run_record is None:
+        print('Wrong run id to export:', run)
+        return
+
+    export_run_record(run_record, path)
+    print(f'Run [{run}] is exported to {path}')
+
+
+def show_export_airflow(pipeline: str, path: str, storage_path: str = None, schedule: str = None):
+    try:
+        pipe_record = get_collection('pipeline').find({'name': pipeline}).next()
+    except StopIteration:
+        print('Wrong pipeline name to export:', pipeline)
+        return
+
+    from backend.src.airflow_dag import write_dag
+    from backend.src.main import Pipeline
+
+    pipe = Pipeline.from_arango(get_collection('pipeline'), pipe_record['_key'])
+    dag_path = write_dag(pipe, path, storage_path=storage_path, schedule=schedule)
+    print(f'Pipeline [{pipeline}] is exported to the Airflow DAG {dag_path}')
+
+
+def add_another_task(new_pipeline: 'Pipeline'):
+    from backend.src.main import Task
+
     print('Choose the task type:')
     print('[', ', '.join(task.__name__ for task in Task.get_available_tasks()), ']')
     task_type = input('> ')
     print('Choose the task name:')
     task_name = input('> ')
 
-    TaskCls: Type[Task] = next(task for task in Task.get_available_tasks() if task.__name__ == task_type)
+    TaskCls: Type[Task] = Task.registry[task_type]
     task_instance = TaskCls(new_pipeline.name, task_name)
 
     input_attributes = {}
@@ -93,6 +168,8 @@ def add_another_task(new_pipeline: Pipeline):
 
 
 def interactive_add_pipeline():
+    from backend.src.main import Pipeline
+
     print('Interactive pipeline creation interface runs')
 
     print('Enter the pipeline`s name')
@@ -121,6 +198,12 @@ def interactive_add_pipeline():
     print(f'Pipeline [{pipeline_name}] is created')
 
 
+def show_run_server(port: int = 5000):
+    from backend.server.run import run_server
+
+    run_server(port)
+
+
 def interactive_add_task():
     ...
 
@@ -175,6 +258,35 @@ commands_tree = {
                     },
                     'help': 'help cli rm'
                 },
+                'run': {
+                    'commands': {
+                        'pipeline': {
+                            'options': {'pipeline', 'no_cache', 'profile', 'trace_memory', 'report', 'incremental',
+                                        'query_workers', 'engine', 'dask_address'},
+                            'help': 'cli run pipeline [--no-cache] [--profile] [--trace-memory] [--report <path>] '
+                                    '[--incremental] [--query-workers <processes>] [--engine local|dask] '
+                                    '[--dask-address <scheduler>]',
+                            'function': show_run_pipeline
+                        }
+                    },
+                    'help': 'help cli run'
+                },
+                'export': {
+                    'commands': {
+                        'run': {
+                            'options': {'run', 'path'},
+                            'help': 'cli export run --run <run id> --path <path>',
+                            'function': show_export_run
+                        },
+                        'airflow': {
+                            'options': {'pipeline', 'path', 'storage_path', 'schedule'},
+                            'help': 'cli export airflow --pipeline <name> --path <file or DAGs folder> '
+                                    '[--storage-path <shared storage>] [--schedule <cron or preset>]',
+                            'function': show_export_airflow
+                        }
+                    },
+                    'help': 'help cli export'
+                },
             },
             'help': 'help 2 level cli'
         },
@@ -183,7 +295,7 @@ commands_tree = {
                 'run': {
                     'options': {'port'},
                     'help': 'backend run helper',
-                    'function': run_server
+                    'function': show_run_server
                 }
             },
             'help': 'help 2 level backend'
@@ -223,11 +335,15 @@ if __name__ == '__main__':
     if stop_reading is not None:
         current_arg_name = None
         for kwarg_op in sys.argv[stop_reading:]:
-            if current_arg_name is None:
-                current_arg_name = kwarg_op.lstrip('-')
+            if kwarg_op.startswith('--'):
+                if current_arg_name is not None:  # The previous option is a flag without value
+                    options[current_arg_name] = True
+                current_arg_name = kwarg_op.lstrip('-').replace('-', '_')
             else:
                 options[current_arg_name] = kwarg_op
                 current_arg_name = None
+        if current_arg_name is not None:
+            options[current_arg_name] = True
 
     if not arguments_list:
         # print help, print error that there are no any required arguments
@@ -0,0 +1,118 @@
+import runpy
+import sys
+import types
+
+import pytest
+
+from backend.src import airflow_dag
+from backend.src.airflow_dag import resolve_secrets, secret_variable, write_dag
+from backend.src.main import CSVQueryTask, DownloadTask, Pipeline, SSHUploadTask
+
+
+class DAG:
+    current = None
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.tasks = {}
+
+    def __enter__(self):
+        DAG.current = self
+        return self
+
+    def __exit__(self, *exc_info):
+        DAG.current = None
+
+
+class PythonOperator:
+    def __init__(self, task_id: str, python_callable, op_kwargs: dict):
+        self.task_id, self.python_callable, self.op_kwargs = task_id, python_callable, op_kwargs
+        self.upstream = []
+        DAG.current.tasks[task_id] = self
+
+    def __rshift__(self, other: 'PythonOperator') -> 'PythonOperator':
+        other.upstream.append(self)
+        return other
+
+
+class Variable:
+    values = {}
+
+    @classmethod
+    def get(cls, key: str):
+        return cls.values[key]
+
+
+class TaskInstance:
+    def __init__(self, xcom: dict):
+        self.xcom = xcom
+
+    def xcom_pull(self, task_ids: str):
+        return self.xcom[task_ids]
+
+
+@pytest.fixture(autouse=True)
+def fake_airflow(monkeypatch):
+    """ The parts of the Airflow API used by the generated DAG files and their operators """
+    modules = {'airflow': {'DAG': DAG}, 'airflow.operators': {}, 'airflow.operators.python': {'PythonOperator':
+                                                                                                PythonOperator},
+               'airflow.models': {'Variable': Variable}}
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(Variable, 'values', {})
+
+
+def test_dag_runs_the_pipeline(tmp_path):
+    source = tmp_path / 'source.csv'
+    source.write_text('\n'.join(f'{i % 7},{i}' for i in range(100)) + '\n')
+    pipeline = Pipeline('my pipe')
+    download = DownloadTask(pipeline.key(), 'download')
+    download.set_input_attributes(source='Local File System', path=str(source))
+    by_a = CSVQueryTask(pipeline.key(), 'by a')
+    by_a.set_input_attributes(columns='a,b', query='select a, count(*) as n group by a')
+    total = CSVQueryTask(pipeline.key(), 'total')
+    total.set_input_attributes(columns='a,b', query='select count(*) as n where b >= 10')
+    pipeline.add(download >> [by_a, total])
+
+    dag = runpy.run_path(str(write_dag(pipeline, tmp_path, storage_path=str(tmp_path / 'storage'))))['dag']
+    xcom, pending = {}, dict(dag.tasks)
+    while pending:
+        task_id, operator = next((task_id, operator) for task_id, operator in pending.items()
+                                 if all(upstream.task_id in xcom for upstream in operator.upstream))
+        xcom[task_id] = operator.python_callable(**operator.op_kwargs, ti=TaskInstance(xcom), run_id='manual__1')
+        del pending[task_id]
+
+    assert {task_id: result['metrics']['rows_out'] for task_id, result in xcom.items()} == {
+        'download': 0, 'by_a': 7, 'total': 1}
+
+
+@pytest.fixture
+def ssh_pipeline() -> Pipeline:
+    pipeline = Pipeline('ssh')
+    upload = SSHUploadTask(pipeline.key(), 'upload')
+    upload.set_input_attributes(ssh_host='host', ssh_user='user', ssh_password='secret', remote_path='/tmp')
+    pipeline.add(upload)
+    return pipeline
+
+
+def test_secrets_stay_out_of_the_dag_file(ssh_pipeline, tmp_path):
+    source = write_dag(ssh_pipeline, tmp_path).read_text()
+    assert 'secret' not in source
+    assert 'ssh_password' not in str(ssh_pipeline.graph_record())
+
+
+def test_secrets_resolved_from_variables_then_arango(ssh_pipeline, monkeypatch):
+    record = ssh_pipeline.graph_record()
+    upload = next(iter(Pipeline.from_arango_record(None, record)))
+    Variable.values[secret_variable(upload, 'ssh_password')] = 'from variable'
+    resolve_secrets(upload)
+    assert upload.attributes['ssh_password'] == 'from variable'
+    assert 'ssh_password' not in record['tasks'][0]['attributes']
+
+    upload = next(iter(Pipeline.from_arango_record(None, record)))
+    Variable.values.clear()
+    monkeypatch.setattr(airflow_dag, 'pipeline_cache', types.SimpleNamespace(get=lambda key: ssh_pipeline))
+    resolve_secrets(upload)
+    assert upload.attributes['ssh_password'] == 'secret'
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.server import routes
+from backend.src.cache import PipelineCache
+from backend.src.main import Pipeline
+
+
+@pytest.fixture
+def stored(monkeypatch) -> dict:
+    """ Stands in for the pipeline documents: key -> _rev, loads are counted """
+    revisions = {'p': '1', 'loads': 0}
+
+    def from_arango(cls, collection, key: str) -> Pipeline:
+        revisions['loads'] += 1
+        pipeline = Pipeline(key)
+        pipeline.record = {'_key': key, '_rev': revisions[key]}
+        return pipeline
+
+    monkeypatch.setattr(Pipeline, 'from_arango', classmethod(from_arango))
+    monkeypatch.setattr(PipelineCache, '_stored_rev', staticmethod(lambda key: revisions[key]))
+    return revisions
+
+
+def test_revision_change_reloads(stored):
+    cache = PipelineCache(revalidate_interval=0)
+    first = cache.get('p')
+    assert cache.get('p') is not first  # Every caller gets its own copy
+    stored['p'] = '2'
+    assert cache.get('p').record['_rev'] == '2'
+    assert stored['loads'] == 2
+    assert cache.stats() == {'size': 1, 'max_size': 128, 'hits': 1, 'misses': 2}
+
+
+def test_least_recently_used_is_dropped(stored):
+    stored['q'] = stored['r'] = '1'
+    cache = PipelineCache(max_size=2)
+    for key in ('p', 'q', 'p', 'r'):
+        cache.get(key)
+    cache.invalidate('r')
+    cache.get('p')
+    assert cache.stats() == {'size': 1, 'max_size': 2, 'hits': 2, 'misses': 3}
+
+
+def test_stats_endpoint(stored, monkeypatch):
+    cache = PipelineCache()
+    cache.get('p')
+    monkeypatch.setattr(routes, 'pipeline_cache', cache)
+    app = FastAPI()
+    app.include_router(routes.router)
+    assert TestClient(app).get('/cache/pipelines').json() == cache.stats()
@@ -0,0 +1,55 @@
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.server import routes
+from backend.src.main import DownloadTask, Pipeline
+
+
+@pytest.fixture
+def client(monkeypatch) -> tuple[TestClient, list[Pipeline]]:
+    """ The stored pipeline [p] with one download task, dumped pipelines are collected instead of uploaded """
+    def get(key: str) -> Pipeline:
+        if key != 'p':
+            raise ValueError(f'Pipeline [{key}] does not exist')
+        pipeline = Pipeline('p')
+        download = DownloadTask('p', 'download')
+        download.set_input_attributes(source='Local File System', path='/data/source.csv')
+        pipeline.add(download)
+        return pipeline
+
+    dumped = []
+    monkeypatch.setattr(routes, 'pipeline_cache', types.SimpleNamespace(get=get))
+    monkeypatch.setattr(Pipeline, 'dump', lambda pipeline: dumped.append(pipeline))
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app), dumped
+
+
+def test_create_task(client):
+    test_client, dumped = client
+    response = test_client.post('/pipelines/p/tasks', json={
+        'name': 'query', 'task_type': 'CSVQueryTask', 'attributes': {'query': 'select count(*) as n'},
+        'upstream': ['download']})
+    assert response.status_code == 201
+    assert response.json() == {'key': 'p_query'}
+
+    task_graph = dumped[0].task_graph
+    assert [task.key() for task in task_graph.task_ordered] == ['p_download', 'p_query']
+    assert task_graph.edges == [('p_download', 'p_query')]
+    assert task_graph.task_ordered[1].attributes == {'query': 'select count(*) as n'}
+
+
+@pytest.mark.parametrize('path, body, status_code', [
+    ('/pipelines/missing/tasks', {'name': 'q', 'task_type': 'CSVQueryTask'}, 404),
+    ('/pipelines/p/tasks', {'name': 'download', 'task_type': 'DownloadTask'}, 409),
+    ('/pipelines/p/tasks', {'name': 'q', 'task_type': 'UnknownTask'}, 422),
+    ('/pipelines/p/tasks', {'name': 'q', 'task_type': 'CSVQueryTask', 'attributes': {'unknown': 1}}, 422),
+    ('/pipelines/p/tasks', {'name': 'q', 'task_type': 'CSVQueryTask', 'upstream': ['missing']}, 422),
+])
+def test_create_task_errors(client, path, body, status_code):
+    test_client, dumped = client
+    assert test_client.post(path, json=body).status_code == status_code
+    assert not dumped
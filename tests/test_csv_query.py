@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from backend.src import main
+from backend.src.main import CSVQueryTask
+
+# `b` is numeric in the first chunks and gets a text value later
+MIXED_CSV = '1,7\n2,8\n3,x\n4,7\n'
+
+
+def execute(query: str | dict, csv_source, chunk_rows: int, **options) -> pd.DataFrame:
+    task = CSVQueryTask('p', 'q')
+    task.set_input_attributes(columns='a,b', query=query)
+    return task.execute(csv_source, chunk_rows=chunk_rows, **options)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('select b, count(*) as n group by b order by b', {'b': ['7', '8', 'x'], 'n': [2, 1, 1]}),
+    ('select distinct b order by b', {'b': ['7', '8', 'x']}),
+    ({'b': ['select', 'distinct']}, {'b': ['7', '8', 'x']}),
+    ('select b, count(*) as n where b >= 8 group by b', {'b': [8], 'n': [1]}),
+    ('select a, count(*) as n group by a order by a desc limit 2', {'a': [4, 3], 'n': [1, 1]}),
+])
+@pytest.mark.parametrize('chunk_rows', [1, 2, 10])
+def test_keys_do_not_depend_on_chunks(query, expected, chunk_rows):
+    assert execute(query, MIXED_CSV, chunk_rows).to_dict('list') == expected
+
+
+def test_keys_do_not_depend_on_partitions(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'PARTITION_MIN_BYTES', 8)
+    path = tmp_path / 'mixed.csv'
+    path.write_text(MIXED_CSV * 10)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        result = execute('select b, count(*) as n group by b order by b', path, 2, executor=executor, partitions=4)
+    assert result.to_dict('list') == {'b': ['7', '8', 'x'], 'n': [20, 10, 10]}
+
+
+def test_numeric_keys_stay_numbers():
+    result = execute({'b': ['select', 'distinct']}, '1,10\n2,9\n3,10\n', chunk_rows=1)
+    assert result['b'].tolist() == [9, 10]
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from backend.src import main
+from backend.src.main import CSVQueryTask, DownloadTask, LocalEngine, LocalStorage, Pipeline
+from backend.src.models import RunRecordModel
+
+
+def query_pipeline(source: Path, query: str, columns: str = None) -> Pipeline:
+    pipeline = Pipeline('incremental')
+    download = DownloadTask(pipeline.key(), 'download')
+    download.set_input_attributes(source='Local File System', path=str(source))
+    csv_query = CSVQueryTask(pipeline.key(), 'query')
+    csv_query.set_input_attributes(query=query, **({'columns': columns} if columns else {}))
+    pipeline.add(download >> csv_query)
+    return pipeline
+
+
+def run_query(engine: LocalEngine, pipeline: Pipeline) -> tuple[RunRecordModel, pd.DataFrame]:
+    record = engine.run(pipeline)
+    assert record['status'] == 'finished'
+    query_dir = engine.storage.task_dir(pipeline.key(), pipeline.task_graph.task_ordered[-1].key())
+    return record, engine.storage.read_columnar(query_dir / 'source.csv.arrow').to_pandas()
+
+
+@pytest.mark.parametrize('columns, header', [(None, 'id,k,v\n'), ('id,k,v', '')])
+@pytest.mark.parametrize('query_workers', [1, 2])
+def test_incremental_equals_full_run(tmp_path, monkeypatch, columns, header, query_workers):
+    monkeypatch.setattr(main, 'PARTITION_MIN_BYTES', 64)  # Partitions even the small test source
+    source = tmp_path / 'source.csv'
+    source.write_text(header + ''.join(f'{i},{"abc"[i % 3]},{i % 5}\n' for i in range(100)))
+    query = 'select k, count(*) as n, sum(v) as total group by k order by k'
+
+    variables = {}
+    for step in range(3):
+        pipeline = query_pipeline(source, query, columns)
+        pipeline.variables = variables
+        engine = LocalEngine(chunk_rows=16, storage=LocalStorage(str(tmp_path / 'incremental')), incremental=True,
+                             query_workers=query_workers)
+        record, incremental = run_query(engine, pipeline)
+        if step:  # Only the appended rows are read
+            assert record['tasks'][0]['bytes_in'] < source.stat().st_size
+
+        full_engine = LocalEngine(chunk_rows=16, storage=LocalStorage(str(tmp_path / f'full-{step}')),
+                                  use_cache=False)
+        _, full = run_query(full_engine, query_pipeline(source, query, columns))
+        pd.testing.assert_frame_equal(incremental, full)
+        assert variables['checkpoint']['generation'] == step + 1
+
+        with open(source, 'a') as source_file:
+            source_file.write(''.join(f'{i},{"abcd"[i % 4]},{i % 7}\n' for i in range(step * 50, step * 50 + 50)))
+
+
+@pytest.mark.parametrize('content', [b'a,b\n1,2\n3,4', bytes(range(256)) * 4], ids=['unterminated', 'binary'])
+def test_sources_without_queries_are_read_whole(tmp_path, content):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(content)
+    pipeline = Pipeline('incremental')
+    download = DownloadTask(pipeline.key(), 'download')
+    download.set_input_attributes(source='Local File System', path=str(source))
+    pipeline.add(download)
+
+    engine = LocalEngine(storage=LocalStorage(str(tmp_path / 'storage')), incremental=True)
+    for _ in range(2):
+        assert engine.run(pipeline)['status'] == 'finished'
+        assert (engine.storage.task_dir(pipeline.key(), download.key()) / 'source.bin').read_bytes() == content
+        assert not pipeline.variables['checkpoint']['sources']
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from backend.src.profiling import PROC_CLEAR_REFS, Instrument, memory_status
+
+MB = 1024 ** 2
+
+
+def touch(size: int) -> bytearray:
+    """ Resident memory of [size] bytes: every page is written """
+    memory = bytearray(size)
+    memory[::4096] = b'1' * len(memory[::4096])
+    return memory
+
+
+@pytest.mark.skipif(not os.access(PROC_CLEAR_REFS, os.W_OK), reason='The high-water mark cannot be reset')
+def test_task_peak_excludes_earlier_peaks():
+    memory = touch(300 * MB)
+    lifetime_peak = memory_status('VmHWM')
+    del memory
+
+    metrics = {}
+    with Instrument().task(metrics):
+        memory = touch(50 * MB)
+        del memory
+
+    assert metrics['peak_rss'] < lifetime_peak - 200 * MB
+    assert 40 * MB <= metrics['rss_growth'] <= 100 * MB
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.src import query as query_module
+from backend.src.query import HyperLogLog, Query
+
+
+def run(query: str | dict, frame: pd.DataFrame, chunk_rows: int = 2) -> pd.DataFrame:
+    """ Executes the query over the frame split into chunks, the way CSVQueryTask reads a source """
+    query = Query.parse(query)
+    chunks = [frame.iloc[start:start + chunk_rows] for start in range(0, len(frame), chunk_rows)]
+    return query.finalize(query.reduce(chunks))
+
+
+@pytest.fixture
+def frame() -> pd.DataFrame:
+    return pd.DataFrame({'k': ['a', 'b', 'a', None, 'c', 'a'], 'v': [1, 2, 3, 4, 5, 6]})
+
+
+def test_parse_clauses():
+    query = Query.parse("select k, count(*) as n where v > 3 and k in ('a', 'b') group by k order by n desc limit 2")
+    assert query.select_order == ['k', 'n']
+    assert query.where == [('v', '>', 3), ('k', 'in', ['a', 'b'])]
+    assert query.group_by == ['k']
+    assert query.order_by == [('n', False)]
+    assert query.limit == 2
+
+
+@pytest.mark.parametrize('sql, operator', [('select k where k is null', 'is null'),
+                                           ('select k where k is not null', 'is not null'),
+                                           ('SELECT k WHERE k IS NOT NULL', 'is not null')])
+def test_parse_null_predicates(sql, operator):
+    assert Query.parse(sql).where == [('k', operator, None)]
+
+
+def test_null_predicates(frame):
+    assert run('select v where k is null', frame)['v'].tolist() == [4]
+    assert run({'select': ['v'], 'where': [['k', 'is not null']]}, frame)['v'].tolist() == [1, 2, 3, 5, 6]
+
+
+def test_parse_dict_equals_sql():
+    from_dict = Query.parse({'select': ['k', 'sum(v) as total'], 'where': [['v', '!=', 2]], 'group_by': ['k'],
+                             'order_by': [['total', 'desc']], 'limit': 1})
+    from_sql = Query.parse('select k, sum(v) as total where v != 2 group by k order by total desc limit 1')
+    assert repr(from_dict) == repr(from_sql)
+
+
+@pytest.mark.parametrize('sql', ['select k where k is 1', 'select k where', 'select k limit -1', 'select k from',
+                                 'select k, where v = 1', 'select median(v)', 'select k, count(*)',
+                                 'select count(*) as n group by k order by v', 'select distinct k order by v'])
+def test_parse_errors(sql):
+    with pytest.raises(ValueError):
+        Query.parse(sql)
+
+
+def test_select_distinct_dictionary(frame):
+    result = run({'k': ['select', 'distinct']}, frame.dropna())
+    assert result['k'].tolist() == ['a', 'b', 'c']
+
+
+def test_aggregates_over_chunks(frame):
+    result = run('select k, count(*) as n, sum(v) as s, min(v) as lo, max(v) as hi, avg(v) as mean '
+                 'where k is not null group by k order by k', frame)
+    assert result.to_dict('list') == {'k': ['a', 'b', 'c'], 'n': [3, 1, 1], 's': [10, 2, 5], 'lo': [1, 2, 5],
+                                      'hi': [6, 2, 5], 'mean': [10 / 3, 2.0, 5.0]}
+
+
+def test_aggregates_without_rows(frame):
+    result = run('select count(*) as n, sum(v) as s where v > 100', frame)
+    assert result['n'].tolist() == [0]
+    assert result['s'].isna().all()
+
+
+def test_order_by_unselected_group_key(frame):
+    result = run('select count(*) as n where k is not null group by k order by k desc', frame)
+    assert result.to_dict('list') == {'n': [1, 1, 3]}
+
+
+def test_order_and_limit(frame):
+    assert run('select v order by v desc limit 2', frame)['v'].tolist() == [6, 5]
+    assert len(run('select v limit 3', frame)) == 3
+
+
+@pytest.mark.parametrize('compact_rows', [1, 1_000_000])
+def test_distinct_over_chunks(monkeypatch, compact_rows):
+    monkeypatch.setattr(query_module, 'DISTINCT_COMPACT_ROWS', compact_rows)
+    frame = pd.DataFrame({'k': [i % 7 for i in range(100)], 'v': [i % 3 for i in range(100)]})
+    result = run('select distinct k, v', frame, chunk_rows=9)
+    assert result.to_dict('list') == frame.drop_duplicates().reset_index(drop=True).to_dict('list')
+
+
+def test_distinct_without_rows(frame):
+    result = run('select distinct k where v > 100', frame)
+    assert result.empty
+    assert list(result.columns) == ['k']
+
+
+@pytest.mark.parametrize('cardinality', [10, 1000, 50_000])
+def test_hyperloglog_estimate(cardinality):
+    values = pd.Series(np.arange(cardinality * 2) % cardinality)
+    estimate = HyperLogLog.of_series(values).estimate()
+    assert abs(estimate - cardinality) <= max(1, cardinality * 0.03)
+
+
+def test_hyperloglog_merge_equals_single_sketch():
+    values = pd.Series(np.arange(20_000))
+    halves = pd.Series([HyperLogLog.of_series(values[:12_000]), HyperLogLog.of_series(values[8_000:])])
+    assert HyperLogLog.merge_series(halves).estimate() == HyperLogLog.of_series(values).estimate()
+
+
+@pytest.mark.parametrize('sql', ['select k, count(*) as n, sum(v) as s, avg(v) as mean, '
+                                 'approx_count_distinct(v) as u group by k order by k',
+                                 'select distinct k order by k',
+                                 'select v where v > 2 order by v desc limit 3'])
+def test_partitions_combine_to_a_single_pass(sql):
+    frame = pd.DataFrame({'k': [i % 5 for i in range(60)], 'v': [i % 13 for i in range(60)]})
+    query = Query.parse(sql)
+    partitions = [query.reduce([frame.iloc[start:start + 20]]) for start in range(0, len(frame), 20)]
+    combined = query.finalize(query.combine(partitions)).reset_index(drop=True)
+    assert combined.equals(run(sql, frame, chunk_rows=7).reset_index(drop=True))
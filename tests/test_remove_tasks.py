@@ -0,0 +1,115 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.cli import REMOVE_TASKS_TRANSACTION
+from backend.server import routes
+
+# Runs the transaction against in-memory stand-ins of the `@arangodb` collections it uses
+NODE_HARNESS = '''
+const Module = require('module');
+const state = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+function collection(docs) {
+    return {
+        docs,
+        exists(key) { return key in docs && {_key: key}; },
+        document(key) { return docs[key]; },
+        inEdges(id) { return Object.values(docs).filter(edge => edge._to === id); },
+        outEdges(id) { return Object.values(docs).filter(edge => edge._from === id); },
+        insert(doc) { docs[doc._key] = doc; },
+        update(key, changes) { docs[key] = {...docs[key], ...changes, _rev: String(Number(docs[key]._rev) + 1)}; },
+        remove(doc) { delete docs[doc._key]; },
+        removeByKeys(keys) { keys.forEach(key => delete docs[key]); },
+    };
+}
+const db = {task: collection(state.task), next: collection(state.next), pipeline: collection(state.pipeline)};
+const require_ = Module.prototype.require;
+Module.prototype.require = function (name) { return name === '@arangodb' ? {db} : require_.apply(this, arguments); };
+try {
+    eval(`(${state.transaction})`)(state.params);
+    console.log(JSON.stringify({task: Object.keys(db.task.docs), next: Object.keys(db.next.docs).sort(),
+                                rev: db.pipeline.docs.p._rev}));
+} catch (error) {
+    console.log(JSON.stringify({error: error.message}));
+}
+'''
+
+
+def run_transaction(task_keys: list[str]) -> dict:
+    tasks = {key: {'_key': key, '_id': f'task/{key}', 'pipeline_key': 'p'} for key in 'abcde'}
+    tasks['x'] = {'_key': 'x', '_id': 'task/x', 'pipeline_key': 'other'}
+    edges = {f'{from_key}-{to_key}': {'_key': f'{from_key}-{to_key}', '_from': f'task/{from_key}',
+                                      '_to': f'task/{to_key}', 'pipeline_key': 'p'}
+             for from_key, to_key in ('ab', 'ac', 'bd', 'cd', 'de')}
+    state = {'transaction': REMOVE_TASKS_TRANSACTION, 'params': {'pipeline_key': 'p', 'task_keys': task_keys},
+             'task': tasks, 'next': edges, 'pipeline': {'p': {'_key': 'p', '_rev': '1'}}}
+    output = subprocess.run(['node', '-e', NODE_HARNESS], input=json.dumps(state), capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='The transaction stand-in runs on node')
+@pytest.mark.parametrize('task_keys, edges', [(['d'], ['a-b', 'a-c', 'b-e', 'c-e']),
+                                              (['b', 'c', 'd'], ['a-e']),
+                                              (['a'], ['b-d', 'c-d', 'd-e'])])
+def test_removed_tasks_are_bypassed(task_keys, edges):
+    result = run_transaction(task_keys)
+    assert result['task'] == [key for key in 'abcdex' if key not in task_keys]
+    assert result['next'] == edges
+    assert result['rev'] == '2'
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='The transaction stand-in runs on node')
+@pytest.mark.parametrize('task_key', ['missing', 'x'])
+def test_tasks_outside_of_the_pipeline_abort(task_key):
+    assert run_transaction(['b', task_key])['error'] == f'Task [{task_key}] is not in the pipeline [p]'
+
+
+class Collection:
+    """ Stands in for an Arango collection in the routes """
+
+    def __init__(self, documents: dict[str, dict]):
+        self.documents = documents
+
+    def has(self, key: str) -> bool:
+        return key in self.documents
+
+    def get(self, key: str) -> dict | None:
+        return self.documents.get(key)
+
+    def get_many(self, keys: list[str]) -> list[dict]:
+        return [self.documents[key] for key in keys if key in self.documents]
+
+
+@pytest.fixture
+def client(monkeypatch) -> tuple[TestClient, list]:
+    collections = {'pipeline': Collection({'p': {}, 'other': {}}),
+                   'task': Collection({'p_a': {'_key': 'p_a', 'pipeline_key': 'p'},
+                                       'other_a': {'_key': 'other_a', 'pipeline_key': 'other'}})}
+    removed = []
+    monkeypatch.setattr(routes, 'get_collection', collections.__getitem__)
+    monkeypatch.setattr(routes, 'remove_task', lambda pipeline_key, task_key: removed.append(task_key))
+    monkeypatch.setattr(routes, 'remove_tasks', lambda pipeline_key, task_keys: removed.extend(task_keys))
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app), removed
+
+
+@pytest.mark.parametrize('path', ['/pipelines/p/tasks/other_a', '/pipelines/p/tasks?keys=other_a',
+                                  '/pipelines/p/tasks/p_b', '/pipelines/missing/tasks/p_a'])
+def test_delete_outside_of_the_pipeline_is_not_found(client, path):
+    test_client, removed = client
+    assert test_client.delete(path).status_code == 404
+    assert not removed
+
+
+@pytest.mark.parametrize('path', ['/pipelines/p/tasks/p_a', '/pipelines/p/tasks?keys=p_a',
+                                  '/pipelines/p/tasks?keys=p_a&keys=p_a'])
+def test_delete_task(client, path):
+    test_client, removed = client
+    assert test_client.delete(path).status_code == 204
+    assert removed == ['p_a']
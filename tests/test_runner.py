@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from backend.server import runner
+from backend.server.runner import RunManager
+from backend.src.main import SSHUploadTask
+
+
+class BlockingCache:
+    """ Stands in for the pipeline cache: the first run waits in it until [release] is set """
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def get(self, pipeline_key: str):
+        self.release.wait(5)
+        raise ValueError(f'Pipeline [{pipeline_key}] does not exist')
+
+
+def test_one_active_run_per_pipeline(monkeypatch):
+    cache = BlockingCache()
+    monkeypatch.setattr(runner, 'pipeline_cache', cache)
+    manager = RunManager(max_workers=2)
+    try:
+        first = manager.submit('p')
+        with pytest.raises(ValueError, match=first['run_id']):
+            manager.submit('p')
+        other = manager.submit('q')
+
+        cache.release.set()
+        manager.executor.shutdown(wait=True)
+        assert {manager.get(run['run_id'])['status'] for run in (first, other)} == {'failed'}
+
+        manager.executor = runner.ThreadPoolExecutor(max_workers=1)
+        assert manager.submit('p')['pipeline_key'] == 'p'
+    finally:
+        manager.shutdown()
+
+
+def test_public_attributes_leave_secrets_out():
+    task = SSHUploadTask('p', 'upload')
+    task.set_input_attributes(ssh_host='host', ssh_user='user', ssh_password='secret', remote_path='/tmp')
+    assert SSHUploadTask.public_attributes(task.attributes) == {'ssh_host': 'host', 'ssh_user': 'user',
+                                                                 'remote_path': '/tmp'}
@@ -0,0 +1,32 @@
+import pytest
+
+from backend.src.main import DownloadTask, TaskGraph
+
+
+def tasks(*names: str) -> list[DownloadTask]:
+    return [DownloadTask('p', name) for name in names]
+
+
+def test_adjacency_follows_the_graph():
+    a, b, c, d = tasks('a', 'b', 'c', 'd')
+    graph = TaskGraph('p', init_task=a) >> [b, c]
+    assert graph.downstream(a) == [b, c]
+    assert graph.upstream(b) == [a]
+
+    graph >> d  # The adjacency is rebuilt once the graph grows
+    assert graph.upstream(d) == [b, c]
+    assert graph.downstream(b) == [d]
+    assert graph.topological_order() == [a, b, c, d]
+
+
+def test_topological_order_of_stored_edges():
+    a, b, c = tasks('a', 'b', 'c')
+    graph = TaskGraph('p', task_ordered=[c, b, a], edges=[('p_a', 'p_b'), ('p_b', 'p_c')])
+    assert graph.topological_order() == [a, b, c]
+
+
+def test_cycle_is_refused():
+    a, b = tasks('a', 'b')
+    graph = TaskGraph('p', task_ordered=[a, b], edges=[('p_a', 'p_b'), ('p_b', 'p_a')])
+    with pytest.raises(ValueError, match='cycle'):
+        graph.topological_order()